@@ -1,17 +1,25 @@
-from flask import Flask, jsonify, request, send_from_directory
+from datetime import timedelta
+from flask import Flask, has_app_context, jsonify, request, send_from_directory
 from flask_jwt_extended import JWTManager
 from .models import *
 from .extensions import db, cache, jwt, celery
 import os
 from dotenv import load_dotenv
-from .controllers import auth_bp, admin_bp, user_bp
+from .controllers import auth_bp, admin_bp, user_bp, live_bp
+from .schema import upgrade_schema
+from .db_engine import configure_engine
+from .metrics import init_metrics
+from .config import ACCESS_TOKEN_MINUTES, REFRESH_TOKEN_DAYS
+from .commands import register_commands
+from .rollups import backfill_rollups
+from . import availability
 from flask_cors import CORS
 
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 
-def create_app():
+def create_app(config_overrides=None):
     frontend_dist_path = os.path.join(basedir, '..', 'frontend', 'dist')
     
     # Configure Flask to serve static files from the root of the 'dist' folder
@@ -19,24 +27,44 @@ def create_app():
     app.config['CACHE_TYPE'] = 'RedisCache'
     app.config['CACHE_REDIS_HOST'] = 'localhost'
     app.config['CACHE_REDIS_PORT'] = 6379
-    app.config['CACHE_REDIS_DB'] = 0
+    app.config['CACHE_REDIS_DB'] = 1
+    app.config['CACHE_KEY_PREFIX'] = 'parking:'
     app.config['CACHE_DEFAULT_TIMEOUT'] = 600  
+    app.config['CACHE_FILL_LOCK_TIMEOUT'] = 10
+    app.config['CACHE_FILL_WAIT'] = 2
+    app.config['CACHE_STALE_TIMEOUT'] = 86400
+    app.config['CACHE_STALE_FACTOR'] = 10  # stale copies outlive their view's timeout at most this many times
+    # Serve free-spot counts and booking claims from Redis (backend/availability.py); needs a Redis cache
+    app.config['AVAILABILITY_INDEX'] = True
 
-    cache.init_app(app)
     load_dotenv()
     app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET_KEY')
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'parking.db')
-    db.init_app(app)
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')
-    jwt.init_app(app)
-    CORS(app)
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=ACCESS_TOKEN_MINUTES)
+    app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=REFRESH_TOKEN_DAYS)
 
     app.config['broker_url'] = 'redis://localhost:6379/0'
     app.config['result_backend'] = 'redis://localhost:6379/0'
 
+    # Benchmarks and maintenance scripts point the app at another database or cache
+    if config_overrides:
+        app.config.update(config_overrides)
+
+    cache.init_app(app)
+    db.init_app(app)
+    configure_engine(app)
+    init_metrics(app)
+    jwt.init_app(app)
+    CORS(app, expose_headers=['X-Next-Cursor', 'X-Next-Offset'])
+
     celery.conf.update(app.config)
     class ContextTask(celery.Task):
         def __call__(self, *args, **kwargs):
+            # A task class is bound to the app current when it was first used; a task
+            # called inside another app's context (tests, eager runs) must run there
+            if has_app_context():
+                return self.run(*args, **kwargs)
             with app.app_context():
                 return self.run(*args, **kwargs)
     celery.Task = ContextTask
@@ -58,6 +86,12 @@ def create_app():
     
     with app.app_context():
         db.create_all()
+        if 'parking_lots.available_count' in upgrade_schema():
+            ParkingLot.reconcile_counts()
+            db.session.commit()
+        if not DailyLotStat.query.first() and Reservation.query.filter_by(is_active=False).first():
+            backfill_rollups()
+        availability.rebuild_missing()
         admin = User.query.filter_by(role='admin').first()
         if not admin:
             admin = User(username="Adminstartor", email='admin@park.com', role='admin')
@@ -67,6 +101,8 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(user_bp)
+    app.register_blueprint(live_bp)
+    register_commands(app)
 
     return app
 
@@ -0,0 +1,274 @@
+from functools import wraps
+from flask import current_app
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from .extensions import cache, db
+from .models import ParkingLot, ParkingSpot
+
+# Live index of free spots: one sorted set per lot (member = spot id, score = spot
+# number) plus a set of the lots whose sorted set has been built. A lot missing
+# from the ready set is served from the database until rebuild() indexes it.
+
+# Pop the `count` lowest-numbered spots, all or nothing unless ARGV[3] is '1' (then up
+# to `count`). Returns nil if the lot is not indexed.
+TAKE_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[2], ARGV[2]) == 0 then return false end
+if ARGV[3] ~= '1' and redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then return {} end
+return redis.call('ZPOPMIN', KEYS[1], ARGV[1])
+"""
+
+# Put spots back, unless the lot was dropped from the index in the meantime.
+RELEASE_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 0 then return 0 end
+for i = 2, #ARGV, 2 do redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1]) end
+return 1
+"""
+
+_scripts = {}
+
+
+def _client():
+    if not current_app.config.get('AVAILABILITY_INDEX'):
+        return None
+    return getattr(cache.cache, '_write_client', None)
+
+
+def _key(name):
+    return cache.cache._get_prefix() + 'avail:' + name
+
+
+def _free_key(lot_id):
+    return _key(str(lot_id))
+
+
+def _ready_key():
+    return _key('ready')
+
+
+def _script(client, source):
+    if (id(client), source) not in _scripts:
+        _scripts[(id(client), source)] = client.register_script(source)
+    return _scripts[(id(client), source)]
+
+
+def _redis_fallback(default=None):
+    """Treat a Redis failure as "not indexed" so callers fall back to the database."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            except RedisError as e:
+                print(f"Availability index unavailable in {fn.__name__}: {e}")
+                return default
+        return wrapper
+    return decorator
+
+
+@_redis_fallback()
+def _take(lot_id, count, partial=False):
+    client = _client()
+    if client is None:
+        return None
+    popped = _script(client, TAKE_SCRIPT)(keys=[_free_key(lot_id), _ready_key()],
+                                          args=[count, lot_id, '1' if partial else '0'])
+    if popped is None:
+        return None
+    return [int(member) for member in popped[::2]]
+
+
+@_redis_fallback()
+def release(lot_id, spots):
+    """Return spots (rows with .id and .spot_number) to the lot's free set after they became Available."""
+    client = _client()
+    if client is None or not spots:
+        return
+    args = [lot_id]
+    for spot in spots:
+        args += [spot.spot_number, spot.id]
+    _script(client, RELEASE_SCRIPT)(keys=[_free_key(lot_id), _ready_key()], args=args)
+
+
+@_redis_fallback()
+def forget(lot_id):
+    """Stop serving a lot from the index until it is rebuilt."""
+    client = _client()
+    if client is not None:
+        client.srem(_ready_key(), lot_id)
+
+
+@_redis_fallback()
+def drop(lot_id):
+    """Remove a deleted lot from the index."""
+    client = _client()
+    if client is not None:
+        client.pipeline().srem(_ready_key(), lot_id).delete(_free_key(lot_id)).execute()
+
+
+def claim(lot_id, count, partial=False):
+    """Claim `count` free spots of a lot for booking, inside the current transaction.
+
+    Pops the lowest spot numbers from the index and confirms them with one
+    conditional UPDATE, so a sold-out lot is refused without touching the
+    database. Lots that are not indexed use ParkingSpot.claim. Returns the
+    claimed (id, spot_number) rows; on rollback the caller hands them to release().
+
+    With partial=True a lot with fewer free spots yields what it has instead
+    of nothing, as the database path always does.
+
+    Spots popped by a request that dies before commit or rollback stay out of
+    the index until check_availability_index rebuilds the lot.
+    """
+    taken = _take(lot_id, count, partial)
+    if taken is None:
+        return ParkingSpot.claim(lot_id, count)
+
+    if not taken:
+        return []
+
+    claimed = ParkingSpot.claim_ids(taken)
+    if len(claimed) < len(taken):
+        # The index handed out spots that are no longer free in the database
+        print(f"Availability index of lot {lot_id} drifted from parking_spots, serving it from the database.")
+        forget(lot_id)
+        claimed += ParkingSpot.claim(lot_id, count - len(claimed))
+    return sorted(claimed, key=lambda row: row.spot_number)
+
+
+@_redis_fallback(default={})
+def free_counts(lot_ids):
+    """Free spots per lot from the index; lots that are not indexed map to None."""
+    client = _client()
+    if client is None:
+        return {lot_id: None for lot_id in lot_ids}
+    pipe = client.pipeline(transaction=False)
+    for lot_id in lot_ids:
+        pipe.sismember(_ready_key(), lot_id).zcard(_free_key(lot_id))
+    replies = pipe.execute()
+    return {lot_id: count if ready else None
+            for lot_id, ready, count in zip(lot_ids, replies[::2], replies[1::2])}
+
+
+def _free_spots(lot_ids):
+    query = select(ParkingSpot.lot_id, ParkingSpot.id, ParkingSpot.spot_number)\
+        .where(ParkingSpot.status == 'Available')
+    if lot_ids is not None:
+        query = query.where(ParkingSpot.lot_id.in_(lot_ids))
+    free = {}
+    for lot_id, spot_id, spot_number in db.session.execute(query):
+        free.setdefault(lot_id, {})[spot_id] = spot_number
+    return free
+
+
+@_redis_fallback(default=0)
+def rebuild(lot_ids=None):
+    """Reload the free sets of the given lots (all lots by default) from parking_spots.
+
+    Returns the number of lots indexed.
+    """
+    client = _client()
+    if client is None:
+        return 0
+    if lot_ids is None:
+        lot_ids = db.session.execute(select(ParkingLot.id)).scalars().all()
+    lot_ids = list(lot_ids)
+    if not lot_ids:
+        return 0
+    free = _free_spots(lot_ids)
+    pipe = client.pipeline(transaction=True)
+    for lot_id in lot_ids:
+        pipe.delete(_free_key(lot_id))
+        if free.get(lot_id):
+            pipe.zadd(_free_key(lot_id), free[lot_id])
+    pipe.sadd(_ready_key(), *lot_ids)
+    pipe.execute()
+    return len(lot_ids)
+
+
+@_redis_fallback(default=0)
+def rebuild_missing():
+    """Index the lots that are not in the ready set, e.g. after a Redis restart."""
+    client = _client()
+    if client is None:
+        return 0
+    ready = {int(lot_id) for lot_id in client.smembers(_ready_key())}
+    lot_ids = db.session.execute(select(ParkingLot.id)).scalars().all()
+    return rebuild([lot_id for lot_id in lot_ids if lot_id not in ready])
+
+
+@_redis_fallback(default=[])
+def check_consistency(lot_ids=None):
+    """Compare the index with parking_spots.
+
+    Returns one dict per lot that is not indexed or disagrees with the database:
+    ``{'lot_id', 'indexed', 'missing', 'extra'}``, where `missing` are free spot ids
+    absent from the index and `extra` are indexed ids that are not free.
+    """
+    client = _client()
+    if client is None:
+        return []
+    if lot_ids is None:
+        lot_ids = db.session.execute(select(ParkingLot.id)).scalars().all()
+    lot_ids = list(lot_ids)
+    free = _free_spots(lot_ids)
+    pipe = client.pipeline(transaction=True)
+    for lot_id in lot_ids:
+        pipe.sismember(_ready_key(), lot_id).zrange(_free_key(lot_id), 0, -1)
+    replies = pipe.execute()
+
+    drift = []
+    for lot_id, ready, members in zip(lot_ids, replies[::2], replies[1::2]):
+        indexed = {int(member) for member in members}
+        expected = set(free.get(lot_id, ()))
+        if not ready or indexed != expected:
+            drift.append({
+                'lot_id': lot_id,
+                'indexed': bool(ready),
+                'missing': sorted(expected - indexed),
+                'extra': sorted(indexed - expected),
+            })
+    return drift
+
+
+def persistent_drift(first, second):
+    """The part of the drift found by two check_consistency() runs that both runs saw."""
+    earlier = {lot['lot_id']: lot for lot in first}
+    drift = []
+    for lot in second:
+        before = earlier.get(lot['lot_id'])
+        if before is None:
+            continue
+        missing = sorted(set(before['missing']) & set(lot['missing']))
+        extra = sorted(set(before['extra']) & set(lot['extra']))
+        indexed = before['indexed'] or lot['indexed']
+        if not indexed or missing or extra:
+            drift.append({'lot_id': lot['lot_id'], 'indexed': indexed, 'missing': missing, 'extra': extra})
+    return drift
+
+
+@_redis_fallback(default=0)
+def repair(drift):
+    """Apply check_consistency() drift to the index spot by spot; lots that are not indexed are rebuilt.
+
+    Unlike rebuild(), this leaves alone the spots that in-flight bookings have popped.
+    Returns the number of lots touched.
+    """
+    client = _client()
+    if client is None or not drift:
+        return 0
+    rebuilt = rebuild([lot['lot_id'] for lot in drift if not lot['indexed']])
+    drift = [lot for lot in drift if lot['indexed']]
+    missing = [spot_id for lot in drift for spot_id in lot['missing']]
+    numbers = dict(db.session.execute(
+        select(ParkingSpot.id, ParkingSpot.spot_number)
+        .where(ParkingSpot.id.in_(missing), ParkingSpot.status == 'Available')
+    ).all()) if missing else {}
+    pipe = client.pipeline(transaction=True)
+    for lot in drift:
+        if lot['extra']:
+            pipe.zrem(_free_key(lot['lot_id']), *lot['extra'])
+        free = {spot_id: numbers[spot_id] for spot_id in lot['missing'] if spot_id in numbers}
+        if free:
+            pipe.zadd(_free_key(lot['lot_id']), free)
+    pipe.execute()
+    return rebuilt + len(drift)
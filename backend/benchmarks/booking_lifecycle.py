@@ -0,0 +1,165 @@
+"""Load test of the booking lifecycle: login, list lots, book, park and vacate.
+
+Seeds a throwaway database of the requested size, then drives the app
+in-process from concurrent test clients. fakeredis stands in for the cache
+and the Celery broker, so it runs offline (``pip install fakeredis[lua]``).
+Latency percentiles and throughput per endpoint are printed and written to
+JSON; pass an earlier result with --compare to see the change per endpoint.
+
+    python -m backend.benchmarks.booking_lifecycle --clients 8 --iterations 50 --output before.json
+    python -m backend.benchmarks.booking_lifecycle --clients 8 --iterations 50 --compare before.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from .. import availability
+from ..extensions import db
+from ..models import User
+from .common import BENCH_PASSWORD, fake_redis_config, make_app, percentile, seed_history, seed_lots, seed_users
+
+ENDPOINTS = ('login', 'list_lots', 'book', 'park', 'vacate')
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(app, lots, spots_per_lot, users, history):
+    with app.app_context():
+        lot_ids = seed_lots(lots, spots_per_lot)
+        user_ids = seed_users(users)
+        if history:
+            seed_history(user_ids, lot_ids, history)
+        availability.rebuild()
+        usernames = [name for (name,) in db.session.query(User.username).filter(User.id.in_(user_ids)).order_by(User.id)]
+    return lot_ids, usernames
+
+
+def run(clients, iterations, lots, spots_per_lot, users, history, seed_value=0):
+    app = make_app(**fake_redis_config())
+    lot_ids, usernames = seed(app, lots, spots_per_lot, max(users, clients), history)
+
+    samples = {name: [] for name in ENDPOINTS}
+    errors = {}
+    lock = threading.Lock()
+
+    def call(client, name, method, url, expected, **kwargs):
+        started = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        elapsed = time.perf_counter() - started
+        with lock:
+            if response.status_code == expected:
+                samples[name].append(elapsed)
+            else:
+                key = f'{name} {response.status_code}'
+                errors[key] = errors.get(key, 0) + 1
+        return response if response.status_code == expected else None
+
+    def worker(index):
+        client = app.test_client()
+        rng = random.Random(seed_value * 1000 + index)
+        username = usernames[index]
+        for _ in range(iterations):
+            login = call(client, 'login', 'post', '/api/login', 200,
+                         json={'username': username, 'password': BENCH_PASSWORD})
+            if login is None:
+                continue
+            headers = {'Authorization': f"Bearer {login.get_json()['access_token']}"}
+            call(client, 'list_lots', 'get', '/api/user/lots', 200, headers=headers)
+            booked = call(client, 'book', 'post', '/api/user/reservations/book', 201, headers=headers,
+                          json={'lot_id': rng.choice(lot_ids), 'number_of_spots': 1})
+            if booked is None:
+                continue
+            reservation_id = booked.get_json()['reservations'][0]['id']
+            call(client, 'park', 'put', '/api/user/reservations/park', 200, headers=headers,
+                 json={'reservation_id': reservation_id})
+            call(client, 'vacate', 'put', '/api/user/reservations/vacate', 200, headers=headers,
+                 json={'reservation_id': reservation_id})
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    endpoints = {}
+    for name in ENDPOINTS:
+        latencies = samples[name]
+        endpoints[name] = {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        }
+    return {
+        'benchmark': 'booking_lifecycle',
+        'commit': _git_commit(),
+        'recorded_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'parameters': {'clients': clients, 'iterations': iterations, 'lots': lots, 'spots_per_lot': spots_per_lot,
+                       'users': max(users, clients), 'history': history, 'seed': seed_value},
+        'elapsed_seconds': round(elapsed, 3),
+        'lifecycles_per_second': round(len(samples['vacate']) / elapsed, 2),
+        'endpoints': endpoints,
+        'errors': errors,
+    }
+
+
+def report(result, baseline=None):
+    print(f"Commit: {result['commit'] or 'unknown'}, parameters: {result['parameters']}")
+    print(f"Elapsed: {result['elapsed_seconds']:.2f}s, lifecycles/sec: {result['lifecycles_per_second']:.1f}")
+    print(f"{'endpoint':<10} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          + (f" {'p95 vs base':>12}" if baseline else ''))
+    for name, stats in result['endpoints'].items():
+        line = (f"{name:<10} {stats['requests']:>8} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.2f} "
+                f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+        base = (baseline or {}).get('endpoints', {}).get(name)
+        if base and base['p95_ms']:
+            line += f" {(stats['p95_ms'] / base['p95_ms'] - 1) * 100:>+11.1f}%"
+        print(line)
+    if result['errors']:
+        print(f"Errors: {result['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--iterations', type=int, default=50, help='lifecycles per client')
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--spots-per-lot', type=int, default=100)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--history', type=int, default=20000, help='closed reservations to seed')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file for the results (default: booking_lifecycle-<commit>.json)')
+    parser.add_argument('--compare', help='earlier JSON result to compare p95 latencies against')
+    args = parser.parse_args()
+
+    result = run(args.clients, args.iterations, args.lots, args.spots_per_lot, args.users, args.history, args.seed)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(result, baseline)
+
+    output = args.output or f"booking_lifecycle-{(result['commit'] or 'worktree')[:12]}.json"
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}")
+    sys.exit(1 if result['errors'] else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Concurrent booking stress test for ParkingSpot.claim().
+
+Many users hammer book_spot on the same lot from parallel threads until it is
+full, then the database is checked for double allocations and counter drift.
+
+    python -m backend.benchmarks.booking_stress --threads 16 --spots 500
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from sqlalchemy import func
+from ..extensions import db
+from ..models import ParkingLot, ParkingSpot, Reservation
+from .common import auth_headers, make_app, seed_lots, seed_users
+
+
+def run(threads, spots, users, max_per_request):
+    app = make_app()
+    with app.app_context():
+        lot_id = seed_lots(1, spots)[0]
+        user_ids = seed_users(users)
+        headers = [auth_headers(user_id) for user_id in user_ids]
+
+    booked = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = app.test_client()
+        rng = random.Random(index)
+        while True:
+            count = rng.randint(1, max_per_request)
+            response = client.post('/api/user/reservations/book', headers=headers[index % len(headers)],
+                                   json={'lot_id': lot_id, 'number_of_spots': count})
+            if response.status_code == 201:
+                with lock:
+                    booked.append(count)
+            elif response.status_code == 404:
+                if count == 1:
+                    return
+            else:
+                with lock:
+                    errors.append(response.status_code)
+                return
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        double_allocated = db.session.query(Reservation.spot_id)\
+            .filter(Reservation.is_active == True)\
+            .group_by(Reservation.spot_id).having(func.count(Reservation.id) > 1).count()
+        booked_spots = ParkingSpot.query.filter_by(lot_id=lot_id, status='Booked').count()
+        active_reservations = Reservation.query.filter_by(is_active=True).count()
+        lot = db.session.get(ParkingLot, lot_id)
+        counters = (lot.available_count, lot.booked_count)
+
+    print(f"Threads: {threads}, spots: {spots}, requests booked: {len(booked)}, spots booked: {sum(booked)}")
+    print(f"Elapsed: {elapsed:.2f}s, bookings/sec: {len(booked) / elapsed:.1f}, spots/sec: {sum(booked) / elapsed:.1f}")
+    print(f"Double allocations: {double_allocated}, booked rows: {booked_spots}, active reservations: {active_reservations}")
+    print(f"Lot counters (available, booked): {counters}, errors: {len(errors)} {sorted(set(errors))}")
+    ok = (double_allocated == 0 and booked_spots == active_reservations == sum(booked)
+          and counters == (spots - booked_spots, booked_spots) and not errors)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--spots', type=int, default=500)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--max-per-request', type=int, default=3)
+    args = parser.parse_args()
+    ok = run(args.threads, args.spots, args.users, args.max_per_request)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Compares one fleet bulk booking with the equivalent loop of book_spot calls.
+
+The loop books lot by lot like a client would: as many spots as the lot has
+free (from /api/user/lots), moving on to the next lot until the fleet is placed.
+Each run starts from a fresh database so both sides see the same free spots.
+
+    python -m backend.benchmarks.bulk_booking --fleet 40 --lots 20 --spots-per-lot 5 --runs 5
+"""
+import argparse
+import statistics
+import time
+from .. import availability
+from .common import auth_headers, fake_redis_config, make_app, seed_lots, seed_users
+
+
+def _setup(lots, spots_per_lot, fake_redis):
+    app = make_app(**(fake_redis_config() if fake_redis else {}))
+    with app.app_context():
+        seed_lots(lots, spots_per_lot)
+        if fake_redis:
+            availability.rebuild()
+        headers = auth_headers(seed_users(1)[0])
+    return app, headers
+
+
+def loop_booking(client, headers, fleet):
+    requests = 1
+    lots = client.get('/api/user/lots', headers=headers).get_json()
+    remaining = fleet
+    for lot in lots:
+        count = min(remaining, lot['available_spots'])
+        if not count:
+            continue
+        requests += 1
+        response = client.post('/api/user/reservations/book', headers=headers,
+                               json={'lot_id': lot['id'], 'number_of_spots': count})
+        if response.status_code == 201:
+            remaining -= count
+        if not remaining:
+            break
+    return requests, fleet - remaining
+
+
+def bulk_booking(client, headers, fleet):
+    response = client.post('/api/user/reservations/bulk-book', headers=headers, json={'number_of_spots': fleet})
+    return 1, len(response.get_json().get('reservations', [])) if response.status_code == 201 else 0
+
+
+def run(fleet, lots, spots_per_lot, runs, fake_redis):
+    print(f"Fleet: {fleet}, lots: {lots} x {spots_per_lot} spots, runs: {runs}, fake redis: {fake_redis}")
+    for name, book in (('loop of book_spot', loop_booking), ('bulk-book', bulk_booking)):
+        timings = []
+        for _ in range(runs):
+            app, headers = _setup(lots, spots_per_lot, fake_redis)
+            client = app.test_client()
+            started = time.perf_counter()
+            requests, booked = book(client, headers, fleet)
+            timings.append(time.perf_counter() - started)
+        print(f"{name:>18}: median {statistics.median(timings) * 1000:8.1f} ms, "
+              f"best {min(timings) * 1000:8.1f} ms, {requests} requests, {booked} spots booked")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fleet', type=int, default=40)
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--spots-per-lot', type=int, default=5)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--fake-redis', action='store_true', help='serve claims from the availability index on fakeredis')
+    args = parser.parse_args()
+    run(args.fleet, args.lots, args.spots_per_lot, args.runs, args.fake_redis)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Helpers shared by the benchmark scripts.
+
+Every benchmark builds its own app on a throwaway SQLite file so it never
+touches parking.db. Run them from the repository root, e.g.
+``python -m backend.benchmarks.booking_stress``.
+"""
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+import pytz
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert, select
+from ..app import create_app
+from ..extensions import db
+from ..passwords import hash_password
+from ..models import ParkingLot, ParkingSpot, Reservation, User
+from ..rollups import backfill_rollups
+
+BENCH_PASSWORD = 'bench-password'
+IST = pytz.timezone("Asia/Kolkata")
+
+
+def make_app(db_path=None, **overrides):
+    """Create the Flask app on a temporary database with an in-process cache."""
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='parking-bench-'), 'bench.db')
+    config = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path,
+        'CACHE_TYPE': 'SimpleCache',
+        'SECRET_KEY': 'benchmark-secret-0123456789abcdef',
+        'JWT_SECRET_KEY': 'benchmark-jwt-secret-0123456789abcdef',
+    }
+    config.update(overrides)
+    return create_app(config)
+
+
+def fake_redis_config():
+    """Overrides that back the cache, availability index and live updates with fakeredis.
+
+    Celery runs tasks eagerly on an in-memory broker, so nothing needs a Redis
+    server. Needs ``pip install fakeredis[lua]`` (the index claims spots with Lua).
+    """
+    import fakeredis
+
+    return {
+        'CACHE_TYPE': 'RedisCache',
+        'CACHE_REDIS_HOST': fakeredis.FakeRedis(),
+        'broker_url': 'memory://',
+        'result_backend': 'cache+memory://',
+        'task_always_eager': True,
+    }
+
+
+def seed_lots(count, spots_per_lot, price_per_hour=20.0):
+    """Insert `count` lots with `spots_per_lot` available spots each. Returns the lot ids."""
+    lot_ids = []
+    for i in range(count):
+        lot = ParkingLot(location_name=f'Bench Lot {i}', address=f'{i} Benchmark Road', pincode=f'{600000 + i % 1000:06d}',
+                         total_spots=spots_per_lot, price_per_hour=price_per_hour, available_count=spots_per_lot)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.execute(insert(ParkingSpot), [
+            {'spot_number': n, 'lot_id': lot.id, 'status': 'Available'} for n in range(1, spots_per_lot + 1)
+        ])
+        lot_ids.append(lot.id)
+    db.session.commit()
+    return lot_ids
+
+
+def seed_users(count, prefix='bench_user'):
+    """Insert `count` regular users sharing BENCH_PASSWORD. Returns the user ids."""
+    password_hash = hash_password(BENCH_PASSWORD)
+    start = db.session.query(db.func.count(User.id)).scalar()
+    db.session.execute(insert(User), [
+        {'username': f'{prefix}{start + i}', 'email': f'{prefix}{start + i}@bench.local', 'password_hash': password_hash, 'role': 'user'}
+        for i in range(count)
+    ])
+    db.session.commit()
+    return [user_id for (user_id,) in db.session.query(User.id).filter(User.username.like(f'{prefix}%')).order_by(User.id)]
+
+
+def seed_history(user_ids, lot_ids, count, days=90, seed=0):
+    """Insert `count` closed reservations spread over the last `days` days and rebuild the rollups."""
+    rng = random.Random(seed)
+    spots = db.session.execute(select(ParkingSpot.id, ParkingSpot.lot_id).where(ParkingSpot.lot_id.in_(lot_ids))).all()
+    prices = dict(db.session.execute(select(ParkingLot.id, ParkingLot.price_per_hour).where(ParkingLot.id.in_(lot_ids))).all())
+    now = datetime.now(pytz.UTC).astimezone(IST)
+    rows = []
+    for _ in range(count):
+        spot_id, lot_id = rng.choice(spots)
+        booked = now - timedelta(days=rng.uniform(0, days))
+        parked = booked + timedelta(minutes=rng.uniform(1, 30)) if rng.random() < 0.9 else None
+        left = (parked or booked) + timedelta(hours=rng.uniform(0.1, 8))
+        cost = round(max(1, (left - parked).total_seconds() / 3600) * prices[lot_id], 2) if parked else 0.0
+        rows.append({'spot_id': spot_id, 'user_id': rng.choice(user_ids), 'booking_timestamp': booked,
+                     'parking_timestamp': parked, 'leaving_timestamp': left, 'parking_cost': cost, 'is_active': False})
+        if len(rows) == 5000:
+            db.session.execute(insert(Reservation), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Reservation), rows)
+    db.session.commit()
+    backfill_rollups()
+
+
+def auth_headers(user_id, role='user'):
+    """Issue a bearer token for `user_id` without going through /api/login."""
+    token = create_access_token(identity=str(user_id), additional_claims={'role': role})
+    return {'Authorization': f'Bearer {token}'}
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
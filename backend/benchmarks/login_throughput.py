@@ -0,0 +1,71 @@
+"""Measures /api/login throughput for each number of hash workers.
+
+For every core count the hash pool gets that many workers and as many
+concurrent clients log in; each count is run once with the verified-credential
+cache disabled (every login hashes) and once with it enabled.
+
+    python -m backend.benchmarks.login_throughput --cores 1 2 4 8 --logins 200
+"""
+import argparse
+import os
+import threading
+import time
+from ..config import PASSWORD_HASH_METHOD
+from ..models import User
+from .common import BENCH_PASSWORD, make_app, seed_users
+
+
+def _measure(app, usernames, clients, logins):
+    failures = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = app.test_client()
+        for n in range(index, logins, clients):
+            response = client.post('/api/login', json={'username': usernames[n % len(usernames)], 'password': BENCH_PASSWORD})
+            if response.status_code != 200:
+                with lock:
+                    failures.append(response.status_code)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started, failures
+
+
+def run(cores, logins, users, method):
+    print(f"Hash method: {method}, logins per run: {logins}")
+    print(f"{'cores':>5} {'cold logins/s':>14} {'cached logins/s':>16} {'failures':>9}")
+    for count in cores:
+        rates = []
+        failures = []
+        for cache_seconds in (0, 300):
+            app = make_app(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=count,
+                           PASSWORD_HASH_MAX_PENDING=max(count * 4, 64), PASSWORD_VERIFY_CACHE_SECONDS=cache_seconds)
+            with app.app_context():
+                user_ids = seed_users(users)
+                usernames = [name for (name,) in User.query.with_entities(User.username).filter(User.id.in_(user_ids))]
+            if cache_seconds:
+                _measure(app, usernames, count, len(usernames))  # warm the cache
+            elapsed, run_failures = _measure(app, usernames, count, logins)
+            rates.append(logins / elapsed)
+            failures += run_failures
+        print(f"{count:>5} {rates[0]:>14.1f} {rates[1]:>16.1f} {len(failures):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    default_cores = sorted({1, 2, 4, os.cpu_count() or 1})
+    parser.add_argument('--cores', type=int, nargs='+', default=default_cores)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--method', default=None, help='werkzeug hash method (default: PASSWORD_HASH_METHOD)')
+    args = parser.parse_args()
+    run(args.cores, args.logins, args.users, args.method or PASSWORD_HASH_METHOD)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Measures SMTP delivery throughput: a connection per message vs the pooled Mailer.
+
+Runs against a local aiosmtpd stand-in (``pip install aiosmtpd``), so nothing
+leaves the machine. --latency adds an artificial per-command delay to mimic a
+remote server, where handshakes dominate.
+
+    python -m backend.benchmarks.smtp_throughput --messages 200 --pool-size 4
+"""
+import argparse
+import asyncio
+import smtplib
+import time
+from ..mailer import Mailer, build_message
+
+
+def start_stub_server(port, latency):
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import SMTP
+
+    class SlowSMTP(SMTP):
+        async def push(self, status):
+            await asyncio.sleep(latency)
+            return await super().push(status)
+
+    class Sink:
+        def __init__(self):
+            self.received = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            self.received += 1
+            return '250 OK'
+
+    class SlowController(Controller):
+        def factory(self):
+            return SlowSMTP(self.handler, **self.SMTP_kwargs)
+
+    handler = Sink()
+    controller = SlowController(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    return controller, handler
+
+
+def per_message(port, messages):
+    for message in messages:
+        with smtplib.SMTP('127.0.0.1', port) as server:
+            server.send_message(message)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds added to every SMTP reply')
+    parser.add_argument('--port', type=int, default=8025)
+    args = parser.parse_args()
+
+    controller, handler = start_stub_server(args.port, args.latency)
+    try:
+        messages = [build_message(f'user{i}@bench.local', 'Benchmark', '<p>Hello</p>', sender='bench@park.local')
+                    for i in range(args.messages)]
+
+        started = time.perf_counter()
+        per_message(args.port, messages)
+        baseline = time.perf_counter() - started
+
+        results = {}
+        for pool_size in sorted({1, args.pool_size}):
+            mailer = Mailer(host='127.0.0.1', port=args.port, username='', use_tls=False, pool_size=pool_size)
+            started = time.perf_counter()
+            sent = mailer.send_many(messages)
+            results[pool_size] = (time.perf_counter() - started, sum(sent))
+            mailer.close()
+    finally:
+        controller.stop()
+
+    print(f"{args.messages} messages, {args.latency * 1000:.1f} ms per SMTP reply, {handler.received} received")
+    print(f"connection per message: {baseline:.2f}s ({args.messages / baseline:.1f} msg/s)")
+    for pool_size, (elapsed, sent) in results.items():
+        print(f"pooled mailer, {pool_size} connection(s): {elapsed:.2f}s ({sent / elapsed:.1f} msg/s, {baseline / elapsed:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
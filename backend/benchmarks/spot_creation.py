@@ -0,0 +1,69 @@
+"""Compares per-object ORM writes with the bulk spot paths used by the admin API.
+
+    python -m backend.benchmarks.spot_creation --sizes 1000 10000 100000
+"""
+import argparse
+import time
+from sqlalchemy import select
+from ..extensions import db
+from ..models import ParkingLot, ParkingSpot
+from .common import make_app
+
+
+def _new_lot(size):
+    lot = ParkingLot(location_name=f'Size {size}', address='Benchmark Road', pincode='600000',
+                     total_spots=size, price_per_hour=10.0, available_count=size)
+    db.session.add(lot)
+    db.session.flush()
+    return lot
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    fn()
+    db.session.commit()
+    return time.perf_counter() - started
+
+
+def orm_create(size):
+    lot = _new_lot(size)
+    elapsed = _timed(lambda: [db.session.add(ParkingSpot(spot_number=i, lot_id=lot.id, status='Available'))
+                              for i in range(1, size + 1)])
+    return lot.id, elapsed
+
+
+def bulk_create(size):
+    lot = _new_lot(size)
+    return lot.id, _timed(lambda: ParkingSpot.bulk_create(lot.id, 1, size))
+
+
+def orm_delete(lot_id):
+    def run():
+        for spot in ParkingSpot.query.filter_by(lot_id=lot_id).all():
+            db.session.delete(spot)
+    return _timed(run)
+
+
+def bulk_delete(lot_id):
+    return _timed(lambda: ParkingSpot.bulk_delete(select(ParkingSpot.id).where(ParkingSpot.lot_id == lot_id).scalar_subquery()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        print(f"{'spots':>8} {'orm insert':>11} {'bulk insert':>12} {'speedup':>8} {'orm delete':>11} {'bulk delete':>12} {'speedup':>8}")
+        for size in args.sizes:
+            orm_lot, orm_insert = orm_create(size)
+            bulk_lot, bulk_insert = bulk_create(size)
+            orm_remove = orm_delete(orm_lot)
+            bulk_remove = bulk_delete(bulk_lot)
+            print(f"{size:>8} {orm_insert:>10.3f}s {bulk_insert:>11.3f}s {orm_insert / bulk_insert:>7.1f}x "
+                  f"{orm_remove:>10.3f}s {bulk_remove:>11.3f}s {orm_remove / bulk_remove:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
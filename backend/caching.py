@@ -0,0 +1,142 @@
+import time
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from .extensions import cache
+from .metrics import record_cache
+
+LOTS_SCOPE = 'lots'
+CACHED_ENDPOINTS = set()
+CACHED_HEADERS = ('X-Next-Cursor', 'X-Next-Offset')
+
+
+def lot_scope(lot_id):
+    return f'lot:{lot_id}'
+
+
+def _version_key(scope):
+    return f'version:{scope}'
+
+
+def _stats_key(endpoint, outcome):
+    return f'stats:{endpoint}:{outcome}'
+
+
+def invalidate(*scopes):
+    """Bump the version of each scope so entries cached under the old version are never read again."""
+    for scope in scopes:
+        cache.cache.inc(_version_key(scope))
+
+
+def invalidate_lots(*lot_ids):
+    """Evict the lot listings and the detail entries of the given lots."""
+    invalidate(LOTS_SCOPE, *[lot_scope(lot_id) for lot_id in lot_ids])
+
+
+def _count(endpoint, outcome):
+    cache.cache.inc(_stats_key(endpoint, outcome))
+    record_cache(outcome)
+
+
+def _request_key():
+    """Identify the cached variant: caller role, path and normalized query string."""
+    verify_jwt_in_request(optional=True)
+    role = get_jwt().get('role', 'anonymous')
+    query = urlencode(sorted(request.args.items(multi=True)))
+    return f'{role}:{request.path}?{query}'
+
+
+def _cached_response(entry):
+    data, status, *headers = entry
+    response = current_app.response_class(data, status=status, mimetype='application/json')
+    if headers:
+        response.headers.update(headers[0])
+    return response
+
+
+def _stale_timeout(timeout):
+    """Keep a stale copy for a few lifetimes of its view, within CACHE_STALE_TIMEOUT.
+
+    Short-lived views keyed by user input (searches) would otherwise leave one
+    long-lived stale entry per distinct query.
+    """
+    config = current_app.config
+    limit = config.get('CACHE_STALE_TIMEOUT', 86400)
+    if timeout is None:
+        timeout = config.get('CACHE_DEFAULT_TIMEOUT', 300)
+    if not timeout:
+        return limit
+    return min(limit, timeout * config.get('CACHE_STALE_FACTOR', 10))
+
+
+def cached_view(*scopes, timeout=None):
+    """Cache a JSON view under the current version of each scope.
+
+    A scope is either a string or a callable receiving the view kwargs, e.g.
+    ``lambda lot_id: lot_scope(lot_id)``. Writes call invalidate()/invalidate_lots()
+    instead of clearing the whole cache.
+
+    Entries are keyed per role and query string. After an invalidation only the
+    worker holding the fill lock recomputes the view; concurrent callers serve
+    the previous copy, or wait for the fill if there is none.
+    """
+    def decorator(fn):
+        CACHED_ENDPOINTS.add(fn.__name__)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            resolved = [scope(**kwargs) if callable(scope) else scope for scope in scopes]
+            versions = cache.get_many(*[_version_key(scope) for scope in resolved]) if resolved else []
+            version_tag = '.'.join(str(version or 0) for version in versions)
+            request_key = _request_key()
+            key = f'view:{request_key}:{version_tag}'
+            stale_key = f'stale:{request_key}'
+
+            cached = cache.get(key)
+            if cached is not None:
+                _count(fn.__name__, 'hits')
+                return _cached_response(cached)
+
+            lock_key = f'lock:{key}'
+            lock_timeout = current_app.config.get('CACHE_FILL_LOCK_TIMEOUT', 10)
+            lock_token = uuid.uuid4().hex
+            if not cache.add(lock_key, lock_token, timeout=lock_timeout):
+                lock_token = None
+                stale = cache.get(stale_key)
+                if stale is not None:
+                    _count(fn.__name__, 'stale')
+                    return _cached_response(stale)
+                deadline = time.monotonic() + current_app.config.get('CACHE_FILL_WAIT', 2)
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    cached = cache.get(key)
+                    if cached is not None:
+                        _count(fn.__name__, 'hits')
+                        return _cached_response(cached)
+
+            _count(fn.__name__, 'misses')
+            try:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code == 200:
+                    headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+                    entry = (response.get_data(), response.status_code, headers)
+                    cache.set(key, entry, timeout=timeout)
+                    cache.set(stale_key, entry, timeout=_stale_timeout(timeout))
+            finally:
+                # Waiters that timed out fill without the lock and must not drop the holder's
+                if lock_token is not None and cache.get(lock_key) == lock_token:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_stats():
+    """Return {endpoint: {'hits': n, 'misses': n, 'stale': n}} for every cached endpoint."""
+    outcomes = ('hits', 'misses', 'stale')
+    endpoints = sorted(CACHED_ENDPOINTS)
+    keys = [_stats_key(endpoint, outcome) for endpoint in endpoints for outcome in outcomes]
+    values = iter(cache.get_many(*keys)) if keys else iter([])
+    return {endpoint: {outcome: next(values) or 0 for outcome in outcomes} for endpoint in endpoints}
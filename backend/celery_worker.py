@@ -14,6 +14,18 @@ celery.conf.beat_schedule = {
         'task': 'backend.tasks.send_monthly_reports',
         'schedule': crontab(day_of_month=1, hour=1, minute=0),
     },
+    'dispatch-notifications': {
+        'task': 'backend.tasks.dispatch_notifications',
+        'schedule': 30.0,
+    },
+    'expire-stale-bookings': {
+        'task': 'backend.tasks.expire_stale_bookings',
+        'schedule': crontab(minute='*/5'),
+    },
+    'check-availability-index': {
+        'task': 'backend.tasks.check_availability_index',
+        'schedule': crontab(minute='*/10'),
+    },
     # 'test-every-minute': {
     #      'task': 'backend.tasks.send_monthly_reports',
     #      'schedule': crontab(minute='*'),
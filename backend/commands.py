@@ -0,0 +1,68 @@
+import click
+from . import availability
+from .extensions import db
+from .models import ParkingLot
+from .query_plans import check_query_plans
+from .rollups import backfill_rollups
+from .schema import upgrade_schema
+
+
+def register_commands(app):
+    """Registers maintenance commands on the `flask` CLI."""
+
+    @app.cli.command('reconcile-counters')
+    @click.option('--lot-id', 'lot_ids', multiple=True, type=int, help='Only rebuild these lots.')
+    def reconcile_counters(lot_ids):
+        """Rebuild per-lot spot counters from the parking_spots rows."""
+        updated = ParkingLot.reconcile_counts(list(lot_ids) or None)
+        db.session.commit()
+        click.echo(f"Reconciled spot counters for {updated} lots.")
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Add missing columns and indexes to an existing database."""
+        added = upgrade_schema()
+        if 'parking_lots.available_count' in added:
+            ParkingLot.reconcile_counts()
+            db.session.commit()
+        click.echo(f"Added columns: {', '.join(added) or 'none'}. Missing indexes created.")
+
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', is_flag=True, help='Print every plan, not only the failing ones.')
+    def check_plans(verbose):
+        """Fail if any hot-path controller query does a full table scan."""
+        failures = 0
+        for statement, lines, scans in check_query_plans():
+            if scans:
+                failures += 1
+            if scans or verbose:
+                click.echo(('FULL SCAN of ' + ', '.join(scans) if scans else 'OK') + '\n' + statement)
+                click.echo('\n'.join('    ' + line for line in lines) + '\n')
+        if failures:
+            raise click.ClickException(f"{failures} queries fall back to a full table scan.")
+        click.echo("All hot-path queries use an index.")
+
+    @app.cli.command('backfill-rollups')
+    def backfill():
+        """Rebuild the daily analytics rollups from the reservation history."""
+        backfill_rollups()
+        click.echo("Daily lot and user rollups rebuilt.")
+
+    @app.cli.command('check-availability')
+    @click.option('--lot-id', 'lot_ids', multiple=True, type=int, help='Only check these lots.')
+    @click.option('--repair', is_flag=True, help='Repair the lots that drifted.')
+    def check_availability(lot_ids, repair):
+        """Compare the Redis availability index with parking_spots."""
+        drift = availability.check_consistency(list(lot_ids) or None)
+        for lot in drift:
+            if not lot['indexed']:
+                click.echo(f"Lot {lot['lot_id']}: not indexed")
+            else:
+                click.echo(f"Lot {lot['lot_id']}: missing {lot['missing']}, extra {lot['extra']}")
+        if drift and repair:
+            availability.repair(drift)
+            click.echo(f"Repaired {len(drift)} lots.")
+        elif drift:
+            raise click.ClickException(f"{len(drift)} lots disagree with the database.")
+        else:
+            click.echo("Availability index matches the database.")
@@ -7,3 +7,62 @@ SENDER_EMAIL = ""
 SENDER_APP_PASSWORD = ""
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
+SMTP_USE_TLS = True
+SMTP_POOL_SIZE = 3          # concurrent authenticated connections per worker process
+SMTP_MAX_RETRIES = 3        # attempts per message on transient failures
+SMTP_RETRY_BACKOFF = 1.0    # seconds, doubled after each failed attempt
+
+
+# --- SQLite Engine Tuning ---
+# Applied to every new connection by backend/db_engine.py (Flask app and Celery worker)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',        # readers no longer block on a booking commit
+    'busy_timeout': 5000,         # ms to wait for the write lock instead of "database is locked"
+    'synchronous': 'NORMAL',      # safe with WAL, avoids an fsync per commit
+    'cache_size': -64000,         # negative = KiB, i.e. 64 MB page cache per connection
+    'mmap_size': 268435456,       # 256 MB memory-mapped I/O
+    'temp_store': 'MEMORY',
+}
+
+
+# --- Notification Outbox ---
+NOTIFICATION_BATCH_SIZE = 100      # outbox rows handled per dispatcher run
+NOTIFICATION_MAX_ATTEMPTS = 5      # after this many failures a row is marked 'failed'
+NOTIFICATION_RETRY_BACKOFF = 30    # seconds, doubled after each failed attempt
+NOTIFICATION_TIMEOUT = 10          # seconds per webhook request
+
+
+# --- Booking Expiry ---
+BOOKING_GRACE_MINUTES = 30         # a booking not parked within this window is released
+BOOKING_EXPIRY_BATCH_SIZE = 500    # reservations expired per UPDATE
+AVAILABILITY_RECHECK_SECONDS = 5   # index drift is repaired only if it is still there this much later
+
+
+# --- Live Updates ---
+LIVE_HEARTBEAT_SECONDS = 15        # keep-alive comment interval on idle SSE streams
+LIVE_QUEUE_SIZE = 100              # messages buffered per stream; a client further behind is disconnected
+
+
+# --- Instrumentation ---
+SLOW_QUERY_MS = 200                # statements slower than this are logged and counted
+METRICS_FLUSH_INTERVAL = 5         # seconds between pushes of a worker's metrics to Redis
+
+
+# --- Password Hashing ---
+# werkzeug method string; stored hashes with other parameters are rehashed on the next login
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+PASSWORD_HASH_WORKERS = 2          # hash computations running at once per process
+PASSWORD_HASH_MAX_PENDING = 32     # logins queued for a hash worker before new ones get a 503
+PASSWORD_VERIFY_CACHE_SECONDS = 300  # a verified (user, password hash, password) skips hashing this long; 0 disables
+PASSWORD_VERIFY_CACHE_SIZE = 10000   # entries kept per process
+
+
+# --- Authentication ---
+ACCESS_TOKEN_MINUTES = 10          # lifetime of the bearer token sent with every request
+REFRESH_TOKEN_DAYS = 7             # lifetime of a refresh token; each one can be exchanged once
+PROFILE_CACHE_SIZE = 1024          # user profiles kept per process for /api/profile and token refresh
+PROFILE_CACHE_SECONDS = 60         # bound on how stale another process's profile entry can get
+
+
+# --- Fleet Booking ---
+BULK_BOOKING_MAX_SPOTS = 500       # spots one bulk booking request may ask for
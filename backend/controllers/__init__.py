@@ -1,3 +1,4 @@
 from .auth import auth_bp
 from .admin import admin_bp
-from .user import user_bp
\ No newline at end of file
+from .user import user_bp
+from .live import live_bp
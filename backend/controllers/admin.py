@@ -1,12 +1,19 @@
+from datetime import datetime
 from functools import wraps
-import re
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_jwt_extended import get_jwt, verify_jwt_in_request
 from sqlalchemy import func
 from ..models import *
-from ..extensions import cache, db
-from ..tasks import announce_new_lot
-from sqlalchemy import text
+from ..extensions import db
+from .. import availability, search
+from ..caching import LOTS_SCOPE, cache_stats, cached_view, invalidate_lots, lot_scope
+from ..live import publish_lot_deleted, publish_lots
+from ..exports import csv_download, iter_history_csv
+from ..pagination import reservation_page
+from ..search import SEARCH_CACHE_TIMEOUT, search_response
+from ..notifications import enqueue_notification
+from ..tasks import new_lot_message
+from sqlalchemy import select
 
 
 def admin_required(fn):
@@ -45,24 +52,22 @@ def create_parking_lot():
     except (ValueError, TypeError):
         return jsonify({"msg": "Total spots and price must be valid positive numbers"}), 400
 
-    new_lot = ParkingLot(location_name=location_name, address=address, pincode=pincode, total_spots=total_spots, price_per_hour=price_per_hour)
+    new_lot = ParkingLot(location_name=location_name, address=address, pincode=pincode, total_spots=total_spots, price_per_hour=price_per_hour, available_count=total_spots)
     db.session.add(new_lot)
     db.session.flush()
 
-    for i in range(1, total_spots + 1):
-        new_spot = ParkingSpot(spot_number=i, lot_id=new_lot.id, status='Available')
-        db.session.add(new_spot)
-
+    ParkingSpot.bulk_create(new_lot.id, 1, total_spots)
+    enqueue_notification(new_lot_message(new_lot.location_name, new_lot.address), kind='new_lot')
     db.session.commit()
 
-    announce_new_lot.delay(lot_name=new_lot.location_name, address=new_lot.address)
-
-    cache.clear()
+    availability.rebuild([new_lot.id])
+    invalidate_lots()
+    publish_lots(new_lot.id)
     return jsonify({"msg": "Parking lot created successfully", "lot": new_lot.to_dict()}), 201
 
 @admin_bp.route('/api/admin/lots', methods=['GET'])
 @admin_required
-@cache.cached()
+@cached_view(LOTS_SCOPE)
 def get_all_lots():
     """Get a list of all parking lots."""
     lots = ParkingLot.query.all()
@@ -70,7 +75,7 @@ def get_all_lots():
 
 @admin_bp.route('/api/admin/lots/<int:lot_id>', methods=['GET'])
 @admin_required
-@cache.cached()
+@cached_view(lambda lot_id: lot_scope(lot_id))
 def get_lot_details(lot_id):
     """Get details for a specific lot, including its spots."""
     lot = ParkingLot.query.get_or_404(lot_id)
@@ -109,27 +114,36 @@ def update_parking_lot(lot_id):
             current_spots_count = lot.total_spots
 
             if new_total_spots > current_spots_count:
-                for i in range(current_spots_count + 1, new_total_spots + 1):
-                    new_spot = ParkingSpot(spot_number=i, lot_id=lot.id, status='Available')
-                    db.session.add(new_spot)
+                added = ParkingSpot.bulk_create(lot.id, current_spots_count + 1, new_total_spots)
+                ParkingLot.shift_counts(lot.id, to_status='Available', count=added)
             
             elif new_total_spots < current_spots_count:
                 spots_to_remove_count = current_spots_count - new_total_spots
-                spots_to_remove = ParkingSpot.query.filter_by(lot_id=lot.id).order_by(ParkingSpot.spot_number.desc()).limit(spots_to_remove_count).all()
-
-                for spot in spots_to_remove:
-                    if spot.status == 'Occupied':
+                spots_to_remove = select(ParkingSpot.id).where(ParkingSpot.lot_id == lot.id)\
+                    .order_by(ParkingSpot.spot_number.desc()).limit(spots_to_remove_count).scalar_subquery()
+                removed_by_status = db.session.query(
+                    ParkingSpot.status,
+                    func.count(ParkingSpot.id),
+                    func.max(ParkingSpot.spot_number)
+                ).filter(ParkingSpot.id.in_(spots_to_remove)).group_by(ParkingSpot.status).all()
+
+                for status, count, highest_spot_number in removed_by_status:
+                    if status == 'Occupied':
                         db.session.rollback()
-                        return jsonify({"msg": f"Cannot reduce spot count. Spot number {spot.spot_number} is currently occupied."}), 400
-                
-                for spot in spots_to_remove:
-                    db.session.delete(spot)
+                        return jsonify({"msg": f"Cannot reduce spot count. Spot number {highest_spot_number} is currently occupied."}), 400
+
+                for status, count, _ in removed_by_status:
+                    ParkingLot.shift_counts(lot.id, from_status=status, count=count)
+                ParkingSpot.bulk_delete(spots_to_remove)
 
             lot.total_spots = new_total_spots
 
         db.session.commit()
 
-        cache.clear()
+        if 'total_spots' in data:
+            availability.rebuild([lot.id])
+        invalidate_lots(lot.id)
+        publish_lots(lot.id)
         return jsonify({"msg": "Parking lot updated successfully", "lot": lot.to_dict()}), 200
 
     except (ValueError, TypeError):
@@ -147,14 +161,15 @@ def delete_parking_lot(lot_id):
     """Delete a parking lot if all its spots are available."""
     lot = ParkingLot.query.get_or_404(lot_id)
     
-    occupied_spots = ParkingSpot.query.filter_by(lot_id=lot.id, status='Occupied').count()
-    if occupied_spots > 0:
+    if lot.occupied_count > 0:
         return jsonify({"msg": "Cannot delete lot. Some parking spots are occupied."}), 400
 
-
+    ParkingSpot.bulk_delete(select(ParkingSpot.id).where(ParkingSpot.lot_id == lot.id).scalar_subquery())
     db.session.delete(lot)
     db.session.commit()
-    cache.clear()
+    availability.drop(lot_id)
+    invalidate_lots(lot_id)
+    publish_lot_deleted(lot_id)
     return jsonify({"msg": "Parking lot deleted successfully"}), 200
 
 @admin_bp.route('/api/admin/users', methods=['GET'])
@@ -167,83 +182,64 @@ def get_all_users():
 @admin_bp.route('/api/admin/reservations', methods=['GET'])
 @admin_required
 def get_all_reservations():
-    """Get a list of all reservations across all users."""
-    reservations = Reservation.query.order_by(Reservation.booking_timestamp.desc()).all()
-    return jsonify([r.to_dict() for r in reservations]), 200
+    """Get a page of reservations across all users, newest first."""
+    try:
+        reservations, next_cursor = reservation_page(Reservation.eager(Reservation.query), request.args, allow_user_filter=True)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    response = jsonify([r.to_dict() for r in reservations])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+@admin_bp.route('/api/admin/export-csv', methods=['GET'])
+@admin_required
+def download_all_export_csv():
+    """Admin: Stream every user's closed reservations as CSV, gzip-compressed with ?gzip=1."""
+    filename = f"all_parking_history_{datetime.now().strftime('%Y%m%d')}.csv"
+    body, headers = csv_download(iter_history_csv(), filename, compress=request.args.get('gzip') == '1')
+    return Response(stream_with_context(body), headers=headers)
+
+@admin_bp.route('/api/admin/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Admin: Get hit/miss counters for each cached endpoint."""
+    return jsonify(cache_stats()), 200
 
 @admin_bp.route('/api/admin/analytics', methods=['GET'])
 @admin_required
 def get_admin_analytics():
-    """Admin: Get aggregated analytics data for charts."""
-    revenue_per_lot = db.session.query(
-        ParkingLot.location_name,
-        func.sum(Reservation.parking_cost)
-    ).join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)\
-     .join(Reservation, Reservation.spot_id == ParkingSpot.id)\
-     .group_by(ParkingLot.location_name).all()
-    
-    bookings_per_lot = db.session.query(
+    """Admin: Get aggregated analytics data for charts from the daily rollups."""
+    per_lot = db.session.query(
         ParkingLot.location_name,
-        func.count(Reservation.id)
-    ).join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)\
-     .join(Reservation, Reservation.spot_id == ParkingSpot.id)\
-     .group_by(ParkingLot.location_name).all()
+        func.sum(DailyLotStat.revenue),
+        func.sum(DailyLotStat.bookings)
+    ).join(ParkingLot, ParkingLot.id == DailyLotStat.lot_id)\
+     .group_by(ParkingLot.id, ParkingLot.location_name)\
+     .order_by(ParkingLot.id).all()
 
     return jsonify({
         'revenuePerLot': {
-            'labels': [item[0] for item in revenue_per_lot],
-            'data': [item[1] for item in revenue_per_lot]
+            'labels': [item[0] for item in per_lot],
+            'data': [item[1] for item in per_lot]
         },
         'bookingsPerLot': {
-            'labels': [item[0] for item in bookings_per_lot],
-            'data': [item[1] for item in bookings_per_lot]
+            'labels': [item[0] for item in per_lot],
+            'data': [item[2] for item in per_lot]
         }
     })
 
-def escape_fts_query(query):
-    return re.sub(r'[\W]+', ' ', query) 
-
 @admin_bp.route('/api/admin/lots/search', methods=['GET'])
 @admin_required
+@cached_view(LOTS_SCOPE, timeout=SEARCH_CACHE_TIMEOUT)
 def search_lots():
-    """Search parking lots using"""
-    query = request.args.get('q', '').strip()
-    if not query:
-        return get_all_lots()
-
-    query = escape_fts_query(query) 
-    
-    result = db.session.execute(
-        text("SELECT rowid FROM parking_lot_fts WHERE parking_lot_fts MATCH :query ORDER BY rank"),
-        {'query': f'"{query}"*'}
-    ).fetchall()
-    
-    lot_ids = [row[0] for row in result]
-    if not lot_ids:
-        return jsonify([]), 200
-        
-    matching_lots = ParkingLot.query.filter(ParkingLot.id.in_(lot_ids)).all()
-    matching_lots.sort(key=lambda x: lot_ids.index(x.id))
-    return jsonify([lot.to_dict() for lot in matching_lots]), 200
+    """Search parking lots by name, address or pincode, best match first."""
+    return search_response(search.search_lots, request.args)
 
 @admin_bp.route('/api/admin/users/search', methods=['GET'])
 @admin_required
+@cached_view(timeout=SEARCH_CACHE_TIMEOUT)
 def search_users():
-    """Search users using"""
-    query = request.args.get('q', '').strip()
-    if not query:
-        return get_all_users()
-
-    query = escape_fts_query(query) 
-    result = db.session.execute(
-        text("SELECT rowid FROM user_fts WHERE user_fts MATCH :query ORDER BY rank"),
-        {'query': f'"{query}"*'}
-    ).fetchall()
-    
-    user_ids = [row[0] for row in result]
-    if not user_ids:
-        return jsonify([]), 200
-        
-    matching_users = User.query.filter(User.id.in_(user_ids)).all()
-    matching_users.sort(key=lambda x: user_ids.index(x.id))
-    return jsonify([user.to_dict() for user in matching_users]), 200
\ No newline at end of file
+    """Search users by username or email, best match first."""
+    return search_response(search.search_users, request.args)
\ No newline at end of file
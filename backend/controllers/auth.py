@@ -1,11 +1,22 @@
-from datetime import timedelta
+import time
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, get_jwt_identity, jwt_required
 from ..models import User
-from ..extensions import db
+from ..extensions import cache, db
+from ..passwords import HashingBusy, verify
+from ..profiles import get_profile as cached_profile
 
 auth_bp = Blueprint('auth', __name__)
 
+
+def _issue_tokens(user_id, role):
+    """Access and refresh tokens carrying the role claim the route decorators check."""
+    claims = {"role": role}
+    return {
+        "access_token": create_access_token(identity=str(user_id), additional_claims=claims),
+        "refresh_token": create_refresh_token(identity=str(user_id), additional_claims=claims),
+    }
+
 @auth_bp.route('/api/register', methods=['POST'])
 def register():
     """ User registration endpoint."""
@@ -39,24 +50,44 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if user and user.check_password(password):
-        additional_claims = {"role": user.role}
-        access_token = create_access_token(identity=str(user.id), additional_claims=additional_claims, expires_delta=timedelta(minutes=10))
-        return jsonify(access_token=access_token, role=user.role, username=user.username)
+    try:
+        verified = user is not None and verify(user, password)
+    except HashingBusy:
+        return jsonify({"msg": "Too many login attempts in progress, please retry shortly."}), 503, {'Retry-After': '1'}
+
+    if verified:
+        if db.session.is_modified(user):
+            db.session.commit()
+        return jsonify(role=user.role, username=user.username, **_issue_tokens(user.id, user.role))
 
     return jsonify({"msg": "Invalid credentials"}), 401
 
+@auth_bp.route('/api/token/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_tokens():
+    """Exchange a refresh token for a new access and refresh token pair.
+
+    Each refresh token is accepted once; its jti is marked used until it would
+    have expired, so a replayed token is refused.
+    """
+    claims = get_jwt()
+    if not cache.add(f"refresh-used:{claims['jti']}", 1, timeout=max(1, int(claims['exp'] - time.time()))):
+        return jsonify({"msg": "Refresh token has already been used"}), 401
+
+    profile = cached_profile(int(get_jwt_identity()))
+    if not profile:
+        return jsonify({"msg": "User not found"}), 401
+    return jsonify(_issue_tokens(profile['id'], profile['role'])), 200
+
 @auth_bp.route('/api/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     """Fetches the profile details for the currently logged-in user or admin."""
-    current_user_id = int(get_jwt_identity())
-
-    current_user = User.query.get(current_user_id)
-    if not current_user:
+    profile = cached_profile(int(get_jwt_identity()))
+    if not profile:
         return jsonify({"msg": "User not found"}), 404
     
     return jsonify({
-        "username": current_user.username,
-        "email": current_user.email,
+        "username": profile['username'],
+        "email": profile['email'],
     }), 200
@@ -0,0 +1,23 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required
+from ..live import live_updates_enabled, stream_lots
+
+live_bp = Blueprint('live', __name__)
+
+@live_bp.route('/api/lots/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_lot_availability():
+    """Stream availability changes as Server-Sent Events.
+
+    EventSource cannot send headers, so the access token may be passed as ?jwt=.
+    ?lots=1,2,3 limits the stream to those lots; without it every lot is streamed.
+    """
+    if not live_updates_enabled():
+        return jsonify({"msg": "Live updates are not available."}), 503
+    try:
+        lot_ids = [int(lot_id) for lot_id in request.args.get('lots', '').split(',') if lot_id.strip()]
+    except ValueError:
+        return jsonify({"msg": "lots must be a comma-separated list of lot ids."}), 400
+
+    return Response(stream_with_context(stream_lots(lot_ids or None)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
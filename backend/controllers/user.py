@@ -1,14 +1,20 @@
 from datetime import datetime
 from functools import wraps
-import re
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_jwt_extended import get_jwt, get_jwt_identity, verify_jwt_in_request
 import pytz
-from sqlalchemy import func
+from sqlalchemy import Integer, case, cast, func
 from ..models import *
-from ..extensions import cache, db
+from ..config import BULK_BOOKING_MAX_SPOTS
+from ..extensions import db
+from .. import availability, search
+from ..caching import LOTS_SCOPE, cached_view, invalidate_lots
+from ..live import publish_lots
+from ..exports import csv_download, iter_history_csv
+from ..pagination import reservation_page
+from ..search import SEARCH_CACHE_TIMEOUT, search_response
+from ..rollups import record_closed_reservation
 from ..tasks import export_csv_task
-from sqlalchemy import text
 
 def user_required(fn):
     @wraps(fn)
@@ -25,19 +31,36 @@ user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/api/user/lots', methods=['GET'])
 @user_required
-@cache.cached()
+@cached_view(LOTS_SCOPE)
 def get_available_lots():
     """Get a list of all parking lots."""
     lots = ParkingLot.query.all()
     return jsonify([lot.to_dict() for lot in lots]), 200
 
+@user_bp.route('/api/user/lots/<int:lot_id>/availability', methods=['GET'])
+@user_required
+def get_lot_availability(lot_id):
+    """Get the live number of free spots in a lot, from the availability index when it is built."""
+    available = availability.free_counts([lot_id]).get(lot_id)
+    if available is None:
+        lot = ParkingLot.query.get_or_404(lot_id)
+        available = lot.available_count
+    return jsonify({"lot_id": lot_id, "available_spots": available}), 200
+
 @user_bp.route('/api/user/reservations', methods=['GET'])
 @user_required
 def get_user_reservations():
-    """Get their own active and past reservations."""
+    """Get a page of their own active and past reservations, newest first."""
     user_id = int(get_jwt_identity())
-    reservations = Reservation.query.filter_by(user_id=user_id).order_by(Reservation.booking_timestamp.desc()).all()
-    return jsonify([r.to_dict() for r in reservations]), 200
+    try:
+        reservations, next_cursor = reservation_page(Reservation.eager(Reservation.query.filter_by(user_id=user_id)), request.args)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+
+    response = jsonify([r.to_dict() for r in reservations])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
 
 @user_bp.route('/api/user/reservations/book', methods=['POST'])
 @user_required
@@ -58,20 +81,30 @@ def book_spot():
     except (ValueError, TypeError):
         return jsonify({"msg": "Invalid number of spots provided."}), 400
 
-    available_spots = ParkingSpot.query.filter_by(lot_id=int(lot_id), status='Available').order_by(ParkingSpot.spot_number).limit(number_of_spots).all()
+    lot_id = int(lot_id)
+    claimed_spots = availability.claim(lot_id, number_of_spots)
 
-    if len(available_spots) < number_of_spots:
-        return jsonify({"msg": f"Not enough spots available. Only {len(available_spots)} spots are free."}), 404
+    if len(claimed_spots) < number_of_spots:
+        db.session.rollback()
+        availability.release(lot_id, claimed_spots)
+        lot = db.session.get(ParkingLot, lot_id)
+        available_count = lot.available_count if lot else 0
+        return jsonify({"msg": f"Not enough spots available. Only {available_count} spots are free."}), 404
 
     new_reservations = []
-    for spot in available_spots:
-        spot.status = 'Booked'
+    for spot in claimed_spots:
         new_reservation = Reservation(spot_id=spot.id, user_id=user_id)
         db.session.add(new_reservation)
         new_reservations.append(new_reservation)
+    ParkingLot.shift_counts(lot_id, from_status='Available', to_status='Booked', count=len(claimed_spots))
 
     db.session.commit()
-    cache.clear()
+    invalidate_lots(lot_id)
+    publish_lots(lot_id)
+
+    reservation_ids = [r.id for r in new_reservations]
+    new_reservations = Reservation.eager(Reservation.query.filter(Reservation.id.in_(reservation_ids)))\
+        .order_by(Reservation.id).all()
     
     message = f"{number_of_spots} spot{'s' if number_of_spots > 1 else ''} booked successfully!"
     
@@ -80,6 +113,74 @@ def book_spot():
         "reservations": [r.to_dict() for r in new_reservations]
     }), 201
 
+def _fleet_lots(pincode=None, max_price=None):
+    """Lots with free spots for a fleet booking, nearest pincode first, then cheapest."""
+    query = ParkingLot.query.filter(ParkingLot.available_count > 0)
+    if max_price is not None:
+        query = query.filter(ParkingLot.price_per_hour <= max_price)
+    order = []
+    if pincode is not None:
+        order += [case((ParkingLot.pincode == pincode, 0), else_=1),
+                  func.abs(cast(ParkingLot.pincode, Integer) - int(pincode))]
+    return query.order_by(*order, ParkingLot.price_per_hour, ParkingLot.id).all()
+
+@user_bp.route('/api/user/reservations/bulk-book', methods=['POST'])
+@user_required
+def bulk_book_spots():
+    """Book spots for a fleet across as many lots as needed, all or nothing.
+
+    Lots are taken nearest to `pincode` first (exact match, then numerically
+    closest), then cheapest, skipping lots above `max_price`.
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json() or {}
+    pincode = data.get('pincode')
+    max_price = data.get('max_price')
+
+    try:
+        number_of_spots = int(data.get('number_of_spots', 0))
+        max_price = float(max_price) if max_price is not None else None
+    except (ValueError, TypeError):
+        return jsonify({"msg": "Invalid number of spots or max price provided."}), 400
+    if not 0 < number_of_spots <= BULK_BOOKING_MAX_SPOTS:
+        return jsonify({"msg": f"Number of spots must be between 1 and {BULK_BOOKING_MAX_SPOTS}."}), 400
+    if pincode is not None:
+        pincode = str(pincode).strip()
+        if not pincode.isdigit():
+            return jsonify({"msg": "Pincode must be numeric."}), 400
+
+    claimed = {}
+    remaining = number_of_spots
+    for lot in _fleet_lots(pincode, max_price):
+        # Partial: a counter that is a spot behind must not make the whole lot unusable
+        spots = availability.claim(lot.id, remaining, partial=True)
+        if spots:
+            claimed[lot.id] = spots
+            remaining -= len(spots)
+        if remaining == 0:
+            break
+
+    if remaining:
+        db.session.rollback()
+        for lot_id, spots in claimed.items():
+            availability.release(lot_id, spots)
+        return jsonify({"msg": f"Not enough spots available. Only {number_of_spots - remaining} matching spots are free."}), 404
+
+    for lot_id, spots in claimed.items():
+        ParkingLot.shift_counts(lot_id, from_status='Available', to_status='Booked', count=len(spots))
+    reservation_ids = Reservation.bulk_create(user_id, [spot.id for spots in claimed.values() for spot in spots])
+
+    db.session.commit()
+    invalidate_lots(*claimed)
+    publish_lots(*claimed)
+
+    reservations = Reservation.eager(Reservation.query.filter(Reservation.id.in_(reservation_ids)))\
+        .order_by(Reservation.id).all()
+    return jsonify({
+        "msg": f"{number_of_spots} spot{'s' if number_of_spots > 1 else ''} booked across {len(claimed)} lot{'s' if len(claimed) > 1 else ''}.",
+        "reservations": [r.to_dict() for r in reservations]
+    }), 201
+
 @user_bp.route('/api/user/reservations/park', methods=['PUT'])
 @user_required
 def park_vehicle():
@@ -89,15 +190,23 @@ def park_vehicle():
     if not reservation_id:
         return jsonify({"msg": "Reservation ID is required."}), 400
 
-    reservation = Reservation.query.filter_by(id=int(reservation_id), user_id=user_id, is_active=True).first()
-    if not reservation: return jsonify({"msg": "Active booking for this reservation not found."}), 404
-    if reservation.parking_timestamp: return jsonify({"msg": "Vehicle already parked for this reservation."}), 400
+    reservation_id = int(reservation_id)
+    # Conditional UPDATEs: expire_stale_bookings may close the booking while this request runs
+    if not Reservation.start_parking(reservation_id, user_id, datetime.now(pytz.UTC).astimezone(IST)):
+        db.session.rollback()
+        if not Reservation.query.filter_by(id=reservation_id, user_id=user_id, is_active=True).first():
+            return jsonify({"msg": "Active booking for this reservation not found."}), 404
+        return jsonify({"msg": "Vehicle already parked for this reservation."}), 400
 
+    reservation = db.session.get(Reservation, reservation_id)
     spot = reservation.spot
-    spot.status = 'Occupied'
-    reservation.parking_timestamp = datetime.now(pytz.UTC).astimezone(IST)
+    if not ParkingSpot.transition(spot.id, 'Booked', 'Occupied'):
+        db.session.rollback()
+        return jsonify({"msg": "The spot of this booking is no longer held for it."}), 409
+    ParkingLot.shift_counts(spot.lot_id, from_status='Booked', to_status='Occupied')
     db.session.commit()
-    cache.clear()
+    invalidate_lots(spot.lot_id)
+    publish_lots(spot.lot_id)
     return jsonify({"msg": "Vehicle parked successfully.", "reservation": reservation.to_dict()}), 200
 
 @user_bp.route('/api/user/reservations/vacate', methods=['PUT'])
@@ -114,56 +223,67 @@ def vacate_spot():
         return jsonify({"msg": "Active reservation not found."}), 404
 
     spot = reservation.spot
-    
-
-    if reservation.parking_timestamp:
-        lot = spot.lot
-        reservation.leaving_timestamp = datetime.now(pytz.UTC).astimezone(IST)
-        duration = reservation.leaving_timestamp.replace(tzinfo=None) - reservation.parking_timestamp.replace(tzinfo=None)
+    parked = reservation.parking_timestamp is not None
+    leaving_timestamp = datetime.now(pytz.UTC).astimezone(IST)
+    if parked:
+        duration = leaving_timestamp.replace(tzinfo=None) - reservation.parking_timestamp.replace(tzinfo=None)
         hours = max(1, duration.total_seconds() / 3600)
-        reservation.parking_cost = round(hours * lot.price_per_hour, 2)
-        message = f"Spot vacated successfully. Total cost: ₹{reservation.parking_cost:.2f}"
+        parking_cost = round(hours * spot.lot.price_per_hour, 2)
+        message = f"Spot vacated successfully. Total cost: ₹{parking_cost:.2f}"
     else:
-        reservation.leaving_timestamp = datetime.now(pytz.UTC).astimezone(IST)
-        reservation.parking_cost = 0.0
+        parking_cost = 0.0
         message = "Booking cancelled successfully."
 
-    spot.status = 'Available'
-    reservation.is_active = False
+    # Conditional UPDATEs: an expiry or a park of the same booking may commit after the read above
+    from_status = 'Occupied' if parked else 'Booked'
+    if not Reservation.close(reservation.id, parked, leaving_timestamp, parking_cost):
+        db.session.rollback()
+        if not Reservation.query.filter_by(id=reservation.id, is_active=True).first():
+            return jsonify({"msg": "Active reservation not found."}), 404
+        return jsonify({"msg": "This reservation changed meanwhile, please try again."}), 409
+    if not ParkingSpot.transition(spot.id, from_status, 'Available'):
+        db.session.rollback()
+        return jsonify({"msg": "The spot of this reservation is not in the expected state."}), 409
+    ParkingLot.shift_counts(spot.lot_id, from_status=from_status, to_status='Available')
+    record_closed_reservation(reservation, spot.lot_id)
     
     db.session.commit()
-    cache.clear()
+    availability.release(spot.lot_id, [spot])
+    invalidate_lots(spot.lot_id)
+    publish_lots(spot.lot_id)
     return jsonify({"msg": message, "reservation": reservation.to_dict()}), 200
 
 @user_bp.route('/api/user/analytics', methods=['GET'])
 @user_required
 def get_user_analytics():
-    """Get personal analytics data."""
-    user_id = get_jwt_identity()
+    """Get personal analytics data from the daily rollups."""
+    user_id = int(get_jwt_identity())
 
-    lot_usage = db.session.query(
+    month = func.strftime('%Y-%m', DailyUserStat.day)
+    rows = db.session.query(
+        month,
         ParkingLot.location_name,
-        func.count(Reservation.id)
-    ).join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.id)\
-     .join(Reservation, Reservation.spot_id == ParkingSpot.id)\
-     .filter(Reservation.user_id == user_id)\
-     .group_by(ParkingLot.location_name).all()
-
-    spending_per_month = db.session.query(
-        func.strftime('%Y-%m', Reservation.parking_timestamp),
-        func.sum(Reservation.parking_cost)
-    ).filter(Reservation.user_id == user_id, Reservation.parking_cost.isnot(None))\
-     .group_by(func.strftime('%Y-%m', Reservation.parking_timestamp))\
-     .order_by(func.strftime('%Y-%m', Reservation.parking_timestamp)).all()
+        func.sum(DailyUserStat.bookings),
+        func.sum(DailyUserStat.revenue)
+    ).join(ParkingLot, ParkingLot.id == DailyUserStat.lot_id)\
+     .filter(DailyUserStat.user_id == user_id)\
+     .group_by(month, ParkingLot.location_name)\
+     .order_by(month).all()
+
+    lot_usage = {}
+    spending_per_month = {}
+    for month_label, location_name, bookings, revenue in rows:
+        lot_usage[location_name] = lot_usage.get(location_name, 0) + bookings
+        spending_per_month[month_label] = spending_per_month.get(month_label, 0) + revenue
 
     return jsonify({
         'lotUsage': {
-            'labels': [item[0] for item in lot_usage],
-            'data': [item[1] for item in lot_usage]
+            'labels': list(lot_usage.keys()),
+            'data': list(lot_usage.values())
         },
         'spendingPerMonth': {
-            'labels': [item[0] for item in spending_per_month],
-            'data': [item[1] for item in spending_per_month]
+            'labels': list(spending_per_month.keys()),
+            'data': list(spending_per_month.values())
         }
     })
 
@@ -184,29 +304,18 @@ def trigger_export_csv():
     
     return jsonify({"msg": "Your CSV export has started. It will be emailed to you shortly."}), 202
 
-def escape_fts_query(query):
-    return re.sub(r'[\W]+', ' ', query) 
+@user_bp.route('/api/user/export-csv', methods=['GET'])
+@user_required
+def download_export_csv():
+    """Streams their parking history as CSV, gzip-compressed with ?gzip=1."""
+    user_id = int(get_jwt_identity())
+    filename = f"parking_history_{datetime.now().strftime('%Y%m%d')}.csv"
+    body, headers = csv_download(iter_history_csv(user_id), filename, compress=request.args.get('gzip') == '1')
+    return Response(stream_with_context(body), headers=headers)
 
 @user_bp.route('/api/user/lots/search', methods=['GET'])
 @user_required
+@cached_view(LOTS_SCOPE, timeout=SEARCH_CACHE_TIMEOUT)
 def search_lots_user():
-    """Search parking lots using"""
-    query = request.args.get('q', '').strip()
-    if not query:
-        all_lots = ParkingLot.query.all()
-        return jsonify([lot.to_dict() for lot in all_lots]), 200
-
-    query = escape_fts_query(query) 
-
-    result = db.session.execute(
-        text("SELECT rowid FROM parking_lot_fts WHERE parking_lot_fts MATCH :query ORDER BY rank"),
-        {'query': f'"{query}"*'}
-    ).fetchall()
-    
-    lot_ids = [row[0] for row in result]
-    if not lot_ids:
-        return jsonify([]), 200
-        
-    matching_lots = ParkingLot.query.filter(ParkingLot.id.in_(lot_ids)).all()
-    matching_lots.sort(key=lambda x: lot_ids.index(x.id))
-    return jsonify([lot.to_dict() for lot in matching_lots]), 200
+    """Search parking lots by name, address or pincode, best match first."""
+    return search_response(search.search_lots, request.args)
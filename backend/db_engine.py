@@ -0,0 +1,26 @@
+from sqlalchemy import event
+from .config import SQLITE_PRAGMAS
+from .extensions import db
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+
+def configure_engine(app):
+    """Install connect hooks that tune every SQLite connection of the app's engine.
+
+    Pragmas come from SQLITE_PRAGMAS in config.py and can be overridden through
+    app.config['SQLITE_PRAGMAS']. Must run before the first connection is opened.
+    """
+    pragmas = app.config.setdefault('SQLITE_PRAGMAS', dict(SQLITE_PRAGMAS))
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != 'sqlite' or not pragmas:
+            return
+        event.listen(engine, 'connect', _apply_pragmas(pragmas))
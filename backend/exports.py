@@ -0,0 +1,85 @@
+import csv
+import io
+import zlib
+from sqlalchemy import select
+from .extensions import db
+from .models import ParkingLot, ParkingSpot, Reservation, User
+
+CSV_HEADERS = ['Lot Name', 'Spot Number', 'Booked On', 'Parked On', 'Left On', 'Cost (INR)']
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _history_rows(user_id=None, batch_size=1000):
+    """Yield closed reservations as CSV rows from one joined SELECT, fetched `batch_size` rows at a time."""
+    columns = [
+        ParkingLot.location_name,
+        ParkingSpot.spot_number,
+        Reservation.booking_timestamp,
+        Reservation.parking_timestamp,
+        Reservation.leaving_timestamp,
+        Reservation.parking_cost,
+    ]
+    if user_id is None:
+        columns.insert(0, User.username)
+    stmt = select(*columns).select_from(Reservation)\
+        .outerjoin(ParkingSpot, ParkingSpot.id == Reservation.spot_id)\
+        .outerjoin(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)\
+        .where(Reservation.is_active == False)\
+        .order_by(Reservation.booking_timestamp.desc(), Reservation.id.desc())
+    if user_id is None:
+        stmt = stmt.join(User, User.id == Reservation.user_id)
+    else:
+        stmt = stmt.where(Reservation.user_id == user_id)
+
+    for row in db.session.execute(stmt.execution_options(yield_per=batch_size)):
+        *owner, lot_name, spot_number, booked, parked, left, cost = row
+        yield owner + [
+            lot_name or 'N/A',
+            spot_number if spot_number is not None else 'N/A',
+            booked.strftime(TIMESTAMP_FORMAT),
+            parked.strftime(TIMESTAMP_FORMAT) if parked else 'N/A',
+            left.strftime(TIMESTAMP_FORMAT) if left else 'N/A',
+            f"{cost:.2f}" if cost is not None else '0.00',
+        ]
+
+
+def iter_history_csv(user_id=None, rows_per_chunk=500):
+    """Yield the parking history CSV as text chunks of `rows_per_chunk` rows.
+
+    With a user_id the export covers that user; without one it covers every
+    user and starts with a 'User' column. Memory use is bounded by the chunk
+    size whatever the history length.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow((['User'] if user_id is None else []) + CSV_HEADERS)
+    for count, row in enumerate(_history_rows(user_id), start=1):
+        writer.writerow(row)
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_download(chunks, filename, compress=False):
+    """Build the (body iterator, headers) pair of a streamed CSV download."""
+    if compress:
+        return gzip_chunks(chunks), {
+            'Content-Type': 'application/gzip',
+            'Content-Disposition': f'attachment; filename="{filename}.gz"',
+        }
+    return chunks, {
+        'Content-Type': 'text/csv; charset=utf-8',
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    }
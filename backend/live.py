@@ -0,0 +1,180 @@
+import json
+import queue
+import threading
+import time
+from redis.exceptions import RedisError
+from .config import LIVE_HEARTBEAT_SECONDS, LIVE_QUEUE_SIZE
+from .extensions import cache, db
+from .models import ParkingLot
+
+# Availability changes are published on one Redis channel per lot, so a client
+# watching a few lots only receives their messages and "all lots" is a pattern
+# subscription. Each message carries the lot's full to_dict(), which clients
+# merge into their list; a deleted lot is sent as {"lot_id": ..., "deleted": true}.
+
+
+def _client():
+    return getattr(cache.cache, '_write_client', None)
+
+
+def live_updates_enabled():
+    """Live updates need the Redis cache backend for pub/sub."""
+    return _client() is not None
+
+
+def _channel(lot_id):
+    return f"{cache.cache._get_prefix()}live:lot:{lot_id}"
+
+
+def _publish(messages):
+    client = _client()
+    if client is None or not messages:
+        return
+    try:
+        pipe = client.pipeline(transaction=False)
+        for lot_id, payload in messages:
+            pipe.publish(_channel(lot_id), json.dumps(payload))
+        pipe.execute()
+    except RedisError as e:
+        print(f"Error publishing availability of lots {[lot_id for lot_id, _ in messages]}: {e}")
+
+
+def publish_lots(*lot_ids):
+    """Push the current state of the given lots to live subscribers. Call after the commit."""
+    if not lot_ids or _client() is None:
+        return
+    lots = ParkingLot.query.filter(ParkingLot.id.in_(lot_ids)).all()
+    _publish([(lot.id, lot.to_dict()) for lot in lots])
+
+
+def publish_lot_deleted(lot_id):
+    _publish([(lot_id, {'lot_id': lot_id, 'deleted': True})])
+
+
+def _event(name, payload):
+    return f"event: {name}\ndata: {payload}\n\n"
+
+
+class _Subscription:
+    """One stream's share of the hub: the lots it watches and a bounded queue of their messages."""
+
+    def __init__(self, lot_ids):
+        self.lot_ids = {str(lot_id) for lot_id in lot_ids} if lot_ids else None
+        self.messages = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.closed = False
+
+
+class _Hub:
+    """The process's single Redis subscriber, fanning lot messages out to every open stream.
+
+    One pattern subscription per process replaces a pub/sub connection per
+    client. Runs on a daemon thread, which is a greenlet under backend/wsgi.py.
+    A stream that falls LIVE_QUEUE_SIZE messages behind, or any stream when the
+    Redis connection drops, is closed so its EventSource reconnects and starts
+    again from a fresh snapshot.
+    """
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.prefix = prefix
+        self.ready = threading.Event()
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        threading.Thread(target=self._run, name='live-updates', daemon=True).start()
+
+    def subscribe(self, lot_ids):
+        subscription = _Subscription(lot_ids)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _close_all(self):
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, set()
+        for subscription in subscriptions:
+            subscription.closed = True
+
+    def _dispatch(self, channel, data):
+        lot_id = channel.rsplit(':', 1)[-1]
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.lot_ids is not None and lot_id not in subscription.lot_ids:
+                continue
+            try:
+                subscription.messages.put_nowait(data)
+            except queue.Full:
+                self.unsubscribe(subscription)
+                subscription.closed = True
+
+    def _run(self):
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                pubsub.psubscribe(self.prefix + '*')
+                for message in pubsub.listen():
+                    if message['type'] == 'psubscribe':
+                        self.ready.set()
+                    elif message['type'] == 'pmessage':
+                        channel, data = message['channel'], message['data']
+                        self._dispatch(channel.decode() if isinstance(channel, bytes) else channel,
+                                       data.decode() if isinstance(data, bytes) else data)
+            except RedisError as e:
+                print(f"Live updates subscriber lost Redis, reconnecting: {e}")
+            finally:
+                self.ready.clear()
+                self._close_all()
+                pubsub.close()
+            time.sleep(1)
+
+
+_hubs = {}
+_hubs_lock = threading.Lock()
+
+
+def _hub():
+    client, prefix = _client(), _channel('')
+    with _hubs_lock:
+        hub = _hubs.get((id(client), prefix))
+        if hub is None or hub.client is not client:
+            hub = _hubs[(id(client), prefix)] = _Hub(client, prefix)
+        return hub
+
+
+def stream_lots(lot_ids=None, heartbeat=LIVE_HEARTBEAT_SECONDS):
+    """Yield Server-Sent Events for the given lots (all lots by default).
+
+    Starts with a `snapshot` event of the current lots, then one `availability`
+    event per change, with a comment line every `heartbeat` seconds so proxies
+    keep the connection open. Messages come from the process's shared
+    subscriber (_Hub); serve the stream from a gevent worker (gunicorn -k gevent)
+    so idle connections cost a greenlet rather than a thread.
+    """
+    hub = _hub()
+    subscription = hub.subscribe(lot_ids)
+    try:
+        # Subscribed before the snapshot is read, so no change in between is lost
+        hub.ready.wait(heartbeat)
+        query = ParkingLot.query
+        if lot_ids:
+            query = query.filter(ParkingLot.id.in_(lot_ids))
+        snapshot = json.dumps([lot.to_dict() for lot in query.order_by(ParkingLot.id)])
+        db.session.close()  # hand the connection back to the pool for the life of the stream
+
+        yield f"retry: {heartbeat * 1000}\n"
+        yield _event('snapshot', snapshot)
+        while True:
+            try:
+                data = subscription.messages.get(timeout=heartbeat)
+            except queue.Empty:
+                if subscription.closed:
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield _event('availability', data)
+    finally:
+        hub.unsubscribe(subscription)
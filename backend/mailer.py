@@ -0,0 +1,180 @@
+import os
+import queue
+import smtplib
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from .config import (SENDER_EMAIL, SENDER_APP_PASSWORD, SMTP_SERVER, SMTP_PORT, SMTP_USE_TLS,
+                     SMTP_POOL_SIZE, SMTP_MAX_RETRIES, SMTP_RETRY_BACKOFF)
+
+# Connection-level errors after which the connection is dropped and the message retried
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, socket.timeout)
+
+
+def _is_transient(error):
+    """Whether a failed send is worth retrying on a fresh connection.
+
+    smtplib.SMTPException is itself an OSError, so SMTP replies are told apart
+    first: only 4xx replies (e.g. 421 service unavailable, 451 local error) are
+    retried, 5xx ones (550 unknown recipient, 535 bad credentials) are not. Any
+    other socket error (DNS, refused, reset) is.
+    """
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPException):
+        return 400 <= getattr(error, 'smtp_code', 0) < 500
+    return isinstance(error, OSError)
+
+
+def build_message(to_email, subject, html_content, attachment_path=None, sender=SENDER_EMAIL):
+    """Builds an HTML email with an optional file attachment."""
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(html_content, 'html'))
+
+    if attachment_path and os.path.exists(attachment_path):
+        with open(attachment_path, "rb") as attachment:
+            part = MIMEBase("application", "octet-stream")
+            part.set_payload(attachment.read())
+        encoders.encode_base64(part)
+        part.add_header("Content-Disposition", f"attachment; filename=\"{os.path.basename(attachment_path)}\"")
+        msg.attach(part)
+    return msg
+
+
+class Mailer:
+    """Sends mail over a small pool of persistent, authenticated SMTP connections.
+
+    Connections are opened lazily (STARTTLS and login happen once per
+    connection, not per message) and returned to the pool after each send.
+    Transient failures drop the connection and retry with exponential backoff.
+    """
+
+    def __init__(self, host=SMTP_SERVER, port=SMTP_PORT, username=SENDER_EMAIL, password=SENDER_APP_PASSWORD,
+                 use_tls=SMTP_USE_TLS, pool_size=SMTP_POOL_SIZE, max_retries=SMTP_MAX_RETRIES,
+                 retry_backoff=SMTP_RETRY_BACKOFF, timeout=30, idle_check_after=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.idle_check_after = idle_check_after
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            server, last_used = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect_or_release()
+        if time.monotonic() - last_used > self.idle_check_after:
+            try:
+                if server.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except OSError:
+                self._discard(server)
+                return self._connect_or_release()
+        return server
+
+    def _connect_or_release(self):
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, server):
+        self._idle.put((server, time.monotonic()))
+        self._slots.release()
+
+    def _discard(self, server):
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def send(self, message):
+        """Sends one message, retrying transient failures. Returns True on success."""
+        for attempt in range(self.max_retries):
+            try:
+                server = self._acquire()
+            except OSError as e:
+                if not _is_transient(e):
+                    # STARTTLS or login refused; retrying will not help
+                    print(f"Error sending email to {message['To']}: {e}")
+                    return False
+                error = e
+            else:
+                try:
+                    server.send_message(message)
+                    self._release(server)
+                    print(f"Successfully sent email to {message['To']}")
+                    return True
+                except OSError as e:
+                    if not _is_transient(e):
+                        # Permanent rejection (bad recipient, policy); the connection is still usable
+                        self._release(server)
+                        print(f"Error sending email to {message['To']}: {e}")
+                        return False
+                    self._discard(server)
+                    self._slots.release()
+                    error = e
+            if attempt + 1 < self.max_retries:
+                time.sleep(self.retry_backoff * 2 ** attempt)
+        print(f"Error sending email to {message['To']}: {error}")
+        return False
+
+    def send_many(self, messages):
+        """Sends messages concurrently over the pool. Returns one bool per message, in order."""
+        messages = list(messages)
+        if len(messages) <= 1 or self.pool_size <= 1:
+            return [self.send(message) for message in messages]
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, len(messages))) as executor:
+            return list(executor.map(self.send, messages))
+
+    def close(self):
+        """Closes every idle connection."""
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                server.quit()
+            except Exception:
+                self._discard(server)
+
+
+_mailer = None
+_mailer_lock = threading.Lock()
+
+
+def get_mailer():
+    """Returns the process-wide Mailer, created on first use (after Celery forks its workers)."""
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            _mailer = Mailer()
+        return _mailer
@@ -0,0 +1,231 @@
+import threading
+import time
+from celery.signals import task_postrun, task_prerun
+from flask import Response, g, request
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from .config import METRICS_FLUSH_INTERVAL, SLOW_QUERY_MS
+from .extensions import cache, db
+
+# Samples are kept as Prometheus exposition lines ('name{labels}' -> value). Each
+# process accumulates increments locally and adds them to one Redis hash at most
+# every METRICS_FLUSH_INTERVAL seconds (Celery workers after every task), so
+# /metrics on any web worker reports every worker and the Celery pool without a
+# Redis round trip per request. Without a Redis cache the totals stay in-process.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500)
+
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Time to produce the response, per endpoint.'),
+    'http_requests_total': ('counter', 'Requests per endpoint, method and status.'),
+    'http_request_sql_statements': ('histogram', 'SQL statements executed per request.'),
+    'http_request_sql_seconds_total': ('counter', 'Time spent in SQL statements, per endpoint.'),
+    'http_cache_lookups_total': ('counter', 'cached_view outcomes (hit, miss, stale), per endpoint.'),
+    'celery_task_duration_seconds': ('histogram', 'Celery task run time, per task.'),
+    'celery_tasks_total': ('counter', 'Finished Celery tasks per task and state.'),
+    'celery_task_sql_statements_total': ('counter', 'SQL statements executed by Celery tasks.'),
+    'celery_task_sql_seconds_total': ('counter', 'Time spent in SQL statements by Celery tasks.'),
+    'sql_slow_queries_total': ('counter', 'Statements slower than SLOW_QUERY_MS.'),
+}
+
+_lock = threading.Lock()
+_pending = {}
+_totals = {}
+_last_flush = time.monotonic()
+_scope = threading.local()
+
+
+def _sample(name, labels):
+    rendered = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    return f'{name}{{{rendered}}}' if rendered else name
+
+
+def inc(name, labels=None, value=1):
+    key = _sample(name, labels or {})
+    with _lock:
+        _pending[key] = _pending.get(key, 0) + value
+
+
+def observe(name, labels, value, buckets=LATENCY_BUCKETS):
+    """Record one histogram observation as cumulative bucket, sum and count increments."""
+    increments = {_sample(f'{name}_bucket', dict(labels, le=str(le))): 1 for le in buckets if value <= le}
+    increments[_sample(f'{name}_bucket', dict(labels, le='+Inf'))] = 1
+    increments[_sample(f'{name}_sum', labels)] = value
+    increments[_sample(f'{name}_count', labels)] = 1
+    with _lock:
+        for key, amount in increments.items():
+            _pending[key] = _pending.get(key, 0) + amount
+
+
+def _client():
+    return getattr(cache.cache, '_write_client', None)
+
+
+def _hash_key():
+    return cache.cache._get_prefix() + 'metrics'
+
+
+def flush():
+    """Add the increments recorded since the last flush to the shared totals."""
+    global _pending, _last_flush
+    with _lock:
+        pending, _pending = _pending, {}
+        _last_flush = time.monotonic()
+    if not pending:
+        return
+    client = _client()
+    if client is not None:
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, value in pending.items():
+                pipe.hincrbyfloat(_hash_key(), key, value)
+            pipe.execute()
+            return
+        except RedisError as e:
+            print(f"Error flushing metrics to Redis: {e}")
+    with _lock:
+        for key, value in pending.items():
+            _totals[key] = _totals.get(key, 0) + value
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def totals():
+    flush()
+    merged = dict(_totals)
+    client = _client()
+    if client is not None:
+        try:
+            for key, value in client.hgetall(_hash_key()).items():
+                key = key.decode()
+                merged[key] = merged.get(key, 0) + float(value)
+        except RedisError as e:
+            print(f"Error reading metrics from Redis: {e}")
+    return merged
+
+
+def _format(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render():
+    """Render all samples in the Prometheus text exposition format."""
+    by_metric = {}
+    for key, value in totals().items():
+        base = key.split('{', 1)[0]
+        for suffix in ('_bucket', '_sum', '_count'):
+            if base.endswith(suffix) and base[:-len(suffix)] in METRICS:
+                base = base[:-len(suffix)]
+        by_metric.setdefault(base, []).append((key, value))
+
+    lines = []
+    for name in sorted(by_metric):
+        kind, help_text = METRICS.get(name, ('untyped', ''))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for key, value in sorted(by_metric[name]):
+            lines.append(f'{key} {_format(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def record_cache(outcome):
+    """Called by cached_view so the request's cache outcome is counted with its endpoint."""
+    g.cache_outcome = outcome
+
+
+def _start_scope():
+    # A stack, because eager Celery tasks run inside the request that queued them
+    if not hasattr(_scope, 'stack'):
+        _scope.stack = []
+    _scope.stack.append([time.perf_counter(), 0, 0.0])
+
+
+def _in_scope():
+    return bool(getattr(_scope, 'stack', None))
+
+
+def _end_scope():
+    """Returns (duration, statements, sql_seconds); the statements also count towards the enclosing scope."""
+    started, statements, sql_seconds = _scope.stack.pop()
+    if _scope.stack:
+        _scope.stack[-1][1] += statements
+        _scope.stack[-1][2] += sql_seconds
+    return time.perf_counter() - started, statements, sql_seconds
+
+
+def _install_sql_events(engine, slow_query_ms):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        if _in_scope():
+            _scope.stack[-1][1] += 1
+            _scope.stack[-1][2] += elapsed
+        if elapsed * 1000 >= slow_query_ms:
+            inc('sql_slow_queries_total')
+            print(f"Slow query ({elapsed * 1000:.1f} ms): {' '.join(statement.split())} {parameters!r:.200}")
+
+
+def _before_request():
+    _scope.stack = []
+    _start_scope()
+
+
+def _after_request(response):
+    if not _in_scope():
+        return response
+    duration, statements, sql_seconds = _end_scope()
+    endpoint = request.endpoint or 'unmatched'
+    if endpoint == 'metrics':
+        return response
+    labels = {'endpoint': endpoint, 'method': request.method}
+    observe('http_request_duration_seconds', labels, duration)
+    inc('http_requests_total', dict(labels, status=str(response.status_code)))
+    observe('http_request_sql_statements', {'endpoint': endpoint}, statements, STATEMENT_BUCKETS)
+    inc('http_request_sql_seconds_total', {'endpoint': endpoint}, sql_seconds)
+    if 'cache_outcome' in g:
+        inc('http_cache_lookups_total', {'endpoint': endpoint, 'outcome': g.cache_outcome})
+    _maybe_flush()
+    return response
+
+
+def _task_prerun(sender=None, **kwargs):
+    _start_scope()
+
+
+def _task_postrun(sender=None, state=None, **kwargs):
+    if not _in_scope():
+        return
+    duration, statements, sql_seconds = _end_scope()
+    labels = {'task': sender.name}
+    observe('celery_task_duration_seconds', labels, duration)
+    inc('celery_tasks_total', dict(labels, state=state or 'UNKNOWN'))
+    inc('celery_task_sql_statements_total', labels, statements)
+    inc('celery_task_sql_seconds_total', labels, sql_seconds)
+    flush()
+
+
+def init_metrics(app):
+    """Instrument requests, SQL statements and Celery tasks, and serve GET /metrics.
+
+    The slow-query threshold is app.config['SLOW_QUERY_MS'] (default SLOW_QUERY_MS
+    in config.py).
+    """
+    slow_query_ms = app.config.setdefault('SLOW_QUERY_MS', SLOW_QUERY_MS)
+    with app.app_context():
+        _install_sql_events(db.engine, slow_query_ms)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', lambda: Response(render(), mimetype='text/plain; version=0.0.4'))
+
+    task_prerun.connect(_task_prerun, weak=False, dispatch_uid='backend.metrics.task_prerun')
+    task_postrun.connect(_task_postrun, weak=False, dispatch_uid='backend.metrics.task_postrun')
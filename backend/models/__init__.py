@@ -1,3 +1,3 @@
-from .models import User, ParkingLot, ParkingSpot, Reservation
+from .models import User, ParkingLot, ParkingSpot, Reservation, DailyLotStat, DailyUserStat, MonthlyReportDelivery, ReminderDelivery, Notification
 
-__all__ = ["User", "ParkingLot", "ParkingSpot", "Reservation"]
\ No newline at end of file
+__all__ = ["User", "ParkingLot", "ParkingSpot", "Reservation", "DailyLotStat", "DailyUserStat", "MonthlyReportDelivery", "ReminderDelivery", "Notification"]
\ No newline at end of file
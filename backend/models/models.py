@@ -1,14 +1,26 @@
 from ..extensions import db
+from ..passwords import hash_password
 import pytz
+from collections import Counter
 
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 from datetime import datetime
-from sqlalchemy import event, DDL, text
+from sqlalchemy import event, DDL, delete, func, insert, select, text, update
+from sqlalchemy.orm import joinedload
 
 IST = pytz.timezone("Asia/Kolkata")
 
+STATUS_COUNTERS = {
+    'Available': 'available_count',
+    'Booked': 'booked_count',
+    'Occupied': 'occupied_count',
+}
+
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_role', 'role'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -17,7 +29,7 @@ class User(db.Model):
     reservations = db.relationship('Reservation', backref='user',cascade="all, delete-orphan", lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -38,11 +50,38 @@ class ParkingLot(db.Model):
     address = db.Column(db.String(250), nullable=False)
     pincode = db.Column(db.String(6), nullable=False)
     total_spots = db.Column(db.Integer, nullable=False)
+    available_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    booked_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    occupied_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     spots = db.relationship('ParkingSpot', backref='lot', lazy=True, cascade="all, delete-orphan")
 
-    def to_dict(self):
-        available_count = ParkingSpot.query.filter_by(lot_id=self.id, status='Available').count()
+    @staticmethod
+    def shift_counts(lot_id, from_status=None, to_status=None, count=1):
+        """Move `count` spots between status counters inside the current transaction."""
+        values = {}
+        if from_status:
+            column = getattr(ParkingLot, STATUS_COUNTERS[from_status])
+            values[column] = column - count
+        if to_status:
+            column = getattr(ParkingLot, STATUS_COUNTERS[to_status])
+            values[column] = column + count
+        if values:
+            db.session.execute(update(ParkingLot).where(ParkingLot.id == lot_id).values(values))
 
+    @staticmethod
+    def reconcile_counts(lot_ids=None):
+        """Rebuild the status counters from the parking_spots rows."""
+        values = {}
+        for status, attr in STATUS_COUNTERS.items():
+            values[attr] = select(func.count(ParkingSpot.id))\
+                .where(ParkingSpot.lot_id == ParkingLot.id, ParkingSpot.status == status)\
+                .scalar_subquery()
+        stmt = update(ParkingLot).values(values)
+        if lot_ids is not None:
+            stmt = stmt.where(ParkingLot.id.in_(lot_ids))
+        return db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount
+
+    def to_dict(self):
         return {
             'id': self.id,
             'location_name': self.location_name,
@@ -50,17 +89,86 @@ class ParkingLot(db.Model):
             'pincode': self.pincode,
             'total_spots': self.total_spots,
             'price_per_hour': self.price_per_hour,
-            'available_spots': available_count
+            'available_spots': self.available_count
         }
 
 class ParkingSpot(db.Model):
     __tablename__ = 'parking_spots'
+    __table_args__ = (
+        db.Index('ix_parking_spots_lot_status_number', 'lot_id', 'status', 'spot_number'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     spot_number = db.Column(db.Integer, nullable=False)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lots.id'), nullable=False)
     status = db.Column(db.String(10), default='Available', nullable=False)
     reservations = db.relationship('Reservation', backref='spot',cascade="all, delete-orphan", lazy=True)
 
+    @staticmethod
+    def bulk_create(lot_id, first_number, last_number):
+        """Insert spots first_number..last_number of a lot as Available in one executemany."""
+        if last_number < first_number:
+            return 0
+        db.session.execute(insert(ParkingSpot), [
+            {'spot_number': number, 'lot_id': lot_id, 'status': 'Available'}
+            for number in range(first_number, last_number + 1)
+        ])
+        return last_number - first_number + 1
+
+    @staticmethod
+    def bulk_delete(spot_ids):
+        """Delete spots (a list or a subquery of ids) and their reservations with two DELETEs."""
+        options = {'synchronize_session': False}
+        db.session.execute(delete(Reservation).where(Reservation.spot_id.in_(spot_ids)), execution_options=options)
+        db.session.execute(delete(ParkingSpot).where(ParkingSpot.id.in_(spot_ids)), execution_options=options)
+
+    @staticmethod
+    def claim(lot_id, count, new_status='Booked', attempts=3):
+        """Atomically flip up to `count` available spots of a lot to `new_status`.
+
+        Uses a conditional UPDATE ... WHERE status='Available' so two concurrent
+        callers can never claim the same row. Returns the claimed (id, spot_number)
+        rows, lowest spot numbers first; the caller rolls back if it got too few.
+        """
+        claimed = []
+        for _ in range(attempts):
+            remaining = count - len(claimed)
+            if remaining <= 0:
+                break
+            candidates = select(ParkingSpot.id)\
+                .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'Available')\
+                .order_by(ParkingSpot.spot_number)\
+                .limit(remaining)
+            rows = db.session.execute(
+                update(ParkingSpot)
+                .where(ParkingSpot.id.in_(candidates.scalar_subquery()), ParkingSpot.status == 'Available')
+                .values(status=new_status)
+                .returning(ParkingSpot.id, ParkingSpot.spot_number),
+                execution_options={'synchronize_session': False}
+            ).all()
+            if not rows:
+                break
+            claimed.extend(rows)
+        return sorted(claimed, key=lambda row: row.spot_number)
+
+    @staticmethod
+    def claim_ids(spot_ids, new_status='Booked'):
+        """Flip the given spots to `new_status` where they are still available; returns the claimed rows."""
+        return db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.id.in_(spot_ids), ParkingSpot.status == 'Available')
+            .values(status=new_status)
+            .returning(ParkingSpot.id, ParkingSpot.spot_number),
+            execution_options={'synchronize_session': False}
+        ).all()
+
+    @staticmethod
+    def transition(spot_id, from_status, to_status):
+        """Move a spot from `from_status` to `to_status` only if it is still there; returns whether it moved."""
+        return db.session.execute(
+            update(ParkingSpot).where(ParkingSpot.id == spot_id, ParkingSpot.status == from_status)
+            .values(status=to_status)
+        ).rowcount == 1
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -71,6 +179,13 @@ class ParkingSpot(db.Model):
 
 class Reservation(db.Model):
     __tablename__ = 'reservations'
+    __table_args__ = (
+        db.Index('ix_reservations_booking_timestamp_id', 'booking_timestamp', 'id'),
+        db.Index('ix_reservations_user_booking_timestamp_id', 'user_id', 'booking_timestamp', 'id'),
+        db.Index('ix_reservations_user_active', 'user_id', 'is_active'),
+        db.Index('ix_reservations_spot_id', 'spot_id'),
+        db.Index('ix_reservations_active_parking_booking', 'is_active', 'parking_timestamp', 'booking_timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     spot_id = db.Column(db.Integer, db.ForeignKey('parking_spots.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -80,6 +195,87 @@ class Reservation(db.Model):
     parking_cost = db.Column(db.Float, nullable=True)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
 
+    @staticmethod
+    def eager(query, include_user=True):
+        """Attach the loads to_dict() needs (spot, its lot and optionally the user) as joins.
+
+        Serializing N rows of an eager() query costs no lazy loads; lot availability
+        comes from the lot's counter columns.
+        """
+        options = [joinedload(Reservation.spot).joinedload(ParkingSpot.lot)]
+        if include_user:
+            options.append(joinedload(Reservation.user))
+        return query.options(*options)
+
+    @staticmethod
+    def bulk_create(user_id, spot_ids):
+        """Insert an active reservation per spot for one user with a single INSERT; returns the new ids."""
+        if not spot_ids:
+            return []
+        now = datetime.now(pytz.UTC).astimezone(IST)
+        return db.session.execute(
+            insert(Reservation).returning(Reservation.id),
+            [{'spot_id': spot_id, 'user_id': user_id, 'booking_timestamp': now, 'is_active': True} for spot_id in spot_ids]
+        ).scalars().all()
+
+    @staticmethod
+    def start_parking(reservation_id, user_id, now):
+        """Stamp the parking time of an active booking that is not parked yet; returns whether it was."""
+        return db.session.execute(
+            update(Reservation)
+            .where(Reservation.id == reservation_id, Reservation.user_id == user_id,
+                   Reservation.is_active == True, Reservation.parking_timestamp.is_(None))
+            .values(parking_timestamp=now)
+        ).rowcount == 1
+
+    @staticmethod
+    def close(reservation_id, parked, now, cost):
+        """Close an active reservation that is still parked (or still unparked), as read by the caller.
+
+        Returns whether it was; a concurrent expiry, park or vacate makes it False.
+        """
+        was_parked = Reservation.parking_timestamp.isnot(None) if parked else Reservation.parking_timestamp.is_(None)
+        return db.session.execute(
+            update(Reservation)
+            .where(Reservation.id == reservation_id, Reservation.is_active == True, was_parked)
+            .values(is_active=False, leaving_timestamp=now, parking_cost=cost)
+        ).rowcount == 1
+
+    @staticmethod
+    def expire_stale(cutoff, now, limit):
+        """Close up to `limit` bookings made before `cutoff` that were never parked, inside the current transaction.
+
+        Frees their spots and moves the lot counters from Booked to Available.
+        Returns the (user_id, lot_id) pair of every expired reservation and the
+        freed spots as (id, spot_number, lot_id) rows.
+        """
+        stale = select(Reservation.id)\
+            .where(Reservation.is_active == True, Reservation.parking_timestamp.is_(None),
+                   Reservation.booking_timestamp < cutoff)\
+            .order_by(Reservation.booking_timestamp).limit(limit).scalar_subquery()
+        expired = db.session.execute(
+            update(Reservation).where(Reservation.id.in_(stale))
+            .values(is_active=False, leaving_timestamp=now, parking_cost=0.0)
+            .returning(Reservation.spot_id, Reservation.user_id),
+            execution_options={'synchronize_session': False}
+        ).all()
+        if not expired:
+            return [], []
+
+        spot_ids = [spot_id for spot_id, _ in expired]
+        lot_of_spot = dict(db.session.execute(
+            select(ParkingSpot.id, ParkingSpot.lot_id).where(ParkingSpot.id.in_(spot_ids))
+        ).all())
+        freed = db.session.execute(
+            update(ParkingSpot).where(ParkingSpot.id.in_(spot_ids), ParkingSpot.status == 'Booked')
+            .values(status='Available').returning(ParkingSpot.id, ParkingSpot.spot_number, ParkingSpot.lot_id),
+            execution_options={'synchronize_session': False}
+        ).all()
+        freed_per_lot = Counter(spot.lot_id for spot in freed)
+        for lot_id, count in freed_per_lot.items():
+            ParkingLot.shift_counts(lot_id, from_status='Booked', to_status='Available', count=count)
+        return [(user_id, lot_of_spot[spot_id]) for spot_id, user_id in expired], freed
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -91,11 +287,63 @@ class Reservation(db.Model):
             'parking_cost': self.parking_cost,
             'is_active': self.is_active,
             'spot': self.spot.to_dict() if self.spot else None,
-            'lot': self.spot.lot.to_dict() if self.spot and self.spot.lot else None, 
+            'lot': self.spot.lot.to_dict() if self.spot and self.spot.lot else None,
             'user_name' : self.user.username if self.user else None
         }
     
 
+class DailyLotStat(db.Model):
+    """Per-day, per-lot totals of closed reservations, maintained by backend/rollups.py."""
+    __tablename__ = 'daily_lot_stats'
+    day = db.Column(db.Date, primary_key=True)
+    lot_id = db.Column(db.Integer, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    occupied_hours = db.Column(db.Float, nullable=False, default=0.0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyUserStat(db.Model):
+    """Per-day, per-user, per-lot totals of closed reservations, maintained by backend/rollups.py."""
+    __tablename__ = 'daily_user_stats'
+    __table_args__ = (
+        db.Index('ix_daily_user_stats_user_day', 'user_id', 'day'),
+    )
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    occupied_hours = db.Column(db.Float, nullable=False, default=0.0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+
+class MonthlyReportDelivery(db.Model):
+    """Ledger of monthly reports already delivered, so a restarted run skips those users."""
+    __tablename__ = 'monthly_report_deliveries'
+    period = db.Column(db.String(7), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    delivered_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(pytz.UTC).astimezone(IST), nullable=False)
+
+class ReminderDelivery(db.Model):
+    """Ledger of daily reminders, so a user is reminded at most once per day even across retries."""
+    __tablename__ = 'reminder_deliveries'
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+
+class Notification(db.Model):
+    """Outbox of chat notifications, delivered by the dispatcher in backend/notifications.py."""
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        db.Index('ix_notifications_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False, default='general')
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(pytz.UTC).astimezone(IST), nullable=False)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(pytz.UTC).astimezone(IST), nullable=False)
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
 
 @event.listens_for(db.metadata, 'after_create')
 def create_fts_tables(target, connection, **kw):
@@ -119,6 +367,32 @@ def create_fts_tables(target, connection, **kw):
     '''))
 
 
+# Update triggers fire only for the indexed columns: the lot counters and password
+# hashes change on hot paths and must not rewrite the FTS entries.
+FTS_UPDATE_TRIGGERS = {
+    'parking_lots_after_update': '''
+        CREATE TRIGGER IF NOT EXISTS parking_lots_after_update
+        AFTER UPDATE OF location_name, address, pincode ON parking_lots
+        BEGIN
+            INSERT INTO parking_lot_fts(parking_lot_fts, rowid, location_name, address, pincode)
+            VALUES ('delete', old.id, old.location_name, old.address, old.pincode);
+            INSERT INTO parking_lot_fts(rowid, location_name, address, pincode)
+            VALUES (new.id, new.location_name, new.address, new.pincode);
+        END;
+    ''',
+    'users_after_update': '''
+        CREATE TRIGGER IF NOT EXISTS users_after_update
+        AFTER UPDATE OF username, email ON users
+        BEGIN
+            INSERT INTO user_fts(user_fts, rowid, username, email)
+            VALUES ('delete', old.id, old.username, old.email);
+            INSERT INTO user_fts(rowid, username, email)
+            VALUES (new.id, new.username, new.email);
+        END;
+    ''',
+}
+
+
 @event.listens_for(db.metadata, 'after_create')
 def create_fts_triggers(target, connection, **kw):
     """Create triggers to keep FTS tables in sync with main tables."""
@@ -139,16 +413,6 @@ def create_fts_triggers(target, connection, **kw):
             VALUES ('delete', old.id, old.location_name, old.address, old.pincode);
         END;
     '''))
-    connection.execute(text('''
-        CREATE TRIGGER IF NOT EXISTS parking_lots_after_update
-        AFTER UPDATE ON parking_lots
-        BEGIN
-            INSERT INTO parking_lot_fts(parking_lot_fts, rowid, location_name, address, pincode)
-            VALUES ('delete', old.id, old.location_name, old.address, old.pincode);
-            INSERT INTO parking_lot_fts(rowid, location_name, address, pincode)
-            VALUES (new.id, new.location_name, new.address, new.pincode);
-        END;
-    '''))
 
     
     connection.execute(text('''
@@ -167,13 +431,5 @@ def create_fts_triggers(target, connection, **kw):
             VALUES ('delete', old.id, old.username, old.email);
         END;
     '''))
-    connection.execute(text('''
-        CREATE TRIGGER IF NOT EXISTS users_after_update
-        AFTER UPDATE ON users
-        BEGIN
-            INSERT INTO user_fts(user_fts, rowid, username, email)
-            VALUES ('delete', old.id, old.username, old.email);
-            INSERT INTO user_fts(rowid, username, email)
-            VALUES (new.id, new.username, new.email);
-        END;
-    '''))
\ No newline at end of file
+    for ddl in FTS_UPDATE_TRIGGERS.values():
+        connection.execute(text(ddl))
\ No newline at end of file
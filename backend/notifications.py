@@ -0,0 +1,78 @@
+import json
+from datetime import datetime, timedelta
+import pytz
+import requests
+from .config import (GOOGLE_CHAT_WEBHOOK_URL, NOTIFICATION_BATCH_SIZE, NOTIFICATION_MAX_ATTEMPTS,
+                     NOTIFICATION_RETRY_BACKOFF, NOTIFICATION_TIMEOUT)
+from .extensions import db
+from .models import Notification
+
+IST = pytz.timezone("Asia/Kolkata")
+
+DIGEST_TITLES = {
+    'new_lot': "📢 *{count} New Parking Lots Available!*",
+}
+
+_session = None
+
+
+def _http_session():
+    """One keep-alive session per process, so bursts reuse the TLS connection to the webhook."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        _session.headers['Content-Type'] = 'application/json; charset=UTF-8'
+    return _session
+
+
+def enqueue_notification(message, kind='general'):
+    """Adds a chat message to the outbox in the caller's transaction; the dispatcher delivers it."""
+    notification = Notification(kind=kind, message=message)
+    db.session.add(notification)
+    return notification
+
+
+def _digest(kind, notifications):
+    if len(notifications) == 1:
+        return notifications[0].message
+    title = DIGEST_TITLES.get(kind, "🔔 *{count} updates*").format(count=len(notifications))
+    return title + "\n\n" + "\n\n---\n\n".join(n.message for n in notifications)
+
+
+def dispatch_pending(webhook_url=GOOGLE_CHAT_WEBHOOK_URL, limit=NOTIFICATION_BATCH_SIZE):
+    """Delivers due outbox rows, one digest message per kind. Returns (sent, failed) row counts.
+
+    A failed post reschedules its rows with exponential backoff until
+    NOTIFICATION_MAX_ATTEMPTS, after which they are marked 'failed'.
+    """
+    now = datetime.now(pytz.UTC).astimezone(IST)
+    due = Notification.query.filter(Notification.status == 'pending', Notification.next_attempt_at <= now)\
+        .order_by(Notification.id).limit(limit).all()
+
+    by_kind = {}
+    for notification in due:
+        by_kind.setdefault(notification.kind, []).append(notification)
+
+    sent = failed = 0
+    for kind, notifications in by_kind.items():
+        try:
+            response = _http_session().post(webhook_url, data=json.dumps({'text': _digest(kind, notifications)}),
+                                            timeout=NOTIFICATION_TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Error sending {len(notifications)} '{kind}' notifications to Google Chat: {e}")
+            for notification in notifications:
+                notification.attempts += 1
+                if notification.attempts >= NOTIFICATION_MAX_ATTEMPTS:
+                    notification.status = 'failed'
+                else:
+                    notification.next_attempt_at = now + timedelta(seconds=NOTIFICATION_RETRY_BACKOFF * 2 ** (notification.attempts - 1))
+            failed += len(notifications)
+        else:
+            for notification in notifications:
+                notification.status = 'sent'
+                notification.attempts += 1
+                notification.sent_at = now
+            sent += len(notifications)
+        db.session.commit()
+    return sent, failed
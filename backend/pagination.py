@@ -0,0 +1,77 @@
+import base64
+from datetime import datetime
+import pytz
+from sqlalchemy import select, tuple_
+from .models import ParkingSpot, Reservation
+
+IST = pytz.timezone("Asia/Kolkata")
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(reservation):
+    raw = f"{reservation.booking_timestamp.isoformat()}|{reservation.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, reservation_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return _parse_timestamp(timestamp), int(reservation_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+
+
+def _parse_timestamp(value):
+    """Parse an ISO date/datetime into the naive IST form the timestamps are stored in."""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(IST).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_bool(value):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError("active must be true or false.")
+
+
+def reservation_page(query, args, allow_user_filter=False):
+    """Apply filters and a (booking_timestamp, id) keyset seek to a Reservation query.
+
+    Supported args: limit, cursor, lot_id, active, from, to and, for admins,
+    user_id. Returns (reservations, next_cursor); next_cursor is None on the
+    last page. Raises ValueError for malformed parameters.
+    """
+    try:
+        limit = min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError("limit must be a positive integer.")
+
+    try:
+        if args.get('lot_id'):
+            lot_spots = select(ParkingSpot.id).where(ParkingSpot.lot_id == int(args['lot_id'])).scalar_subquery()
+            query = query.filter(Reservation.spot_id.in_(lot_spots))
+        if allow_user_filter and args.get('user_id'):
+            query = query.filter(Reservation.user_id == int(args['user_id']))
+        if args.get('from'):
+            query = query.filter(Reservation.booking_timestamp >= _parse_timestamp(args['from']))
+        if args.get('to'):
+            query = query.filter(Reservation.booking_timestamp < _parse_timestamp(args['to']))
+    except ValueError:
+        raise ValueError("lot_id/user_id must be integers and from/to ISO dates.")
+    if args.get('active'):
+        query = query.filter(Reservation.is_active == _parse_bool(args['active']))
+
+    if args.get('cursor'):
+        timestamp, reservation_id = decode_cursor(args['cursor'])
+        query = query.filter(tuple_(Reservation.booking_timestamp, Reservation.id) < tuple_(timestamp, reservation_id))
+
+    rows = query.order_by(Reservation.booking_timestamp.desc(), Reservation.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,136 @@
+import hashlib
+import hmac
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+from .config import (PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING,
+                     PASSWORD_VERIFY_CACHE_SECONDS, PASSWORD_VERIFY_CACHE_SIZE)
+
+# Password hashing is deliberately slow, so it runs on a small per-process pool
+# instead of the request thread: a login burst then queues for PASSWORD_HASH_WORKERS
+# threads (and is refused once PASSWORD_HASH_MAX_PENDING are waiting) while the
+# rest of the workers keep serving bookings. Successful verifications are
+# remembered per process for PASSWORD_VERIFY_CACHE_SECONDS, keyed by an HMAC of
+# the user, the stored hash and the password, so repeated logins skip the hash and
+# a password change invalidates the entry.
+
+
+class HashingBusy(Exception):
+    """Too many logins are already waiting for a hash worker."""
+
+
+_lock = threading.Lock()
+_executors = {}
+_pending = 0
+_verified = OrderedDict()
+_prefixes = {}
+
+
+def _setting(name, default):
+    return current_app.config.get(name, default)
+
+
+def hash_method():
+    return _setting('PASSWORD_HASH_METHOD', PASSWORD_HASH_METHOD)
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=hash_method())
+
+
+def _stored_prefix(method):
+    """The method prefix werkzeug writes for `method`, which expands short forms like 'scrypt'."""
+    with _lock:
+        prefix = _prefixes.get(method)
+    if prefix is None:
+        prefix = generate_password_hash('', method=method).split('$', 1)[0]
+        with _lock:
+            _prefixes[method] = prefix
+    return prefix
+
+
+def needs_rehash(password_hash):
+    """True when the stored hash was made with other parameters than PASSWORD_HASH_METHOD."""
+    return password_hash.split('$', 1)[0] != _stored_prefix(hash_method())
+
+
+def _executor_class():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return ThreadPoolExecutor
+    if monkey.is_module_patched('threading'):
+        # Under backend/wsgi.py threads are greenlets; hashing must run on native threads
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor
+    return ThreadPoolExecutor
+
+
+def _executor():
+    workers = _setting('PASSWORD_HASH_WORKERS', PASSWORD_HASH_WORKERS)
+    with _lock:
+        if workers not in _executors:
+            _executors[workers] = _executor_class()(max_workers=workers, thread_name_prefix='password-hash')
+        return _executors[workers]
+
+
+def _offload(fn, *args):
+    """Run fn on the hash pool and wait for it, refusing work when the queue is full."""
+    global _pending
+    with _lock:
+        if _pending >= _setting('PASSWORD_HASH_MAX_PENDING', PASSWORD_HASH_MAX_PENDING):
+            raise HashingBusy()
+        _pending += 1
+    try:
+        return _executor().submit(fn, *args).result()
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def _cache_key(user, password):
+    message = f'{user.id}\0{user.password_hash}\0{password}'.encode()
+    return hmac.new(current_app.config['SECRET_KEY'].encode(), message, hashlib.sha256).digest()
+
+
+def _remembered(key):
+    with _lock:
+        expires = _verified.get(key)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del _verified[key]
+            return False
+        return True
+
+
+def _remember(key, ttl):
+    with _lock:
+        _verified[key] = time.monotonic() + ttl
+        _verified.move_to_end(key)
+        while len(_verified) > _setting('PASSWORD_VERIFY_CACHE_SIZE', PASSWORD_VERIFY_CACHE_SIZE):
+            _verified.popitem(last=False)
+
+
+def verify(user, password):
+    """Check a login password for `user`, rehashing it if the hash parameters changed.
+
+    A rehash is added to the current session; the caller commits it. Raises
+    HashingBusy when the hash pool is saturated.
+    """
+    ttl = _setting('PASSWORD_VERIFY_CACHE_SECONDS', PASSWORD_VERIFY_CACHE_SECONDS)
+    key = _cache_key(user, password) if ttl and current_app.config.get('SECRET_KEY') else None
+    if key is not None and _remembered(key):
+        return True
+
+    if not _offload(check_password_hash, user.password_hash, password):
+        return False
+
+    if needs_rehash(user.password_hash):
+        user.password_hash = _offload(generate_password_hash, password, hash_method())
+    if key is not None:
+        _remember(_cache_key(user, password), ttl)
+    return True
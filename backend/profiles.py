@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event
+from .config import PROFILE_CACHE_SIZE, PROFILE_CACHE_SECONDS
+from .extensions import db
+from .models import User
+
+# Per-process LRU of User.to_dict() keyed by user id. Updates and deletes made
+# through the ORM in this process drop the entry at once; entries older than
+# PROFILE_CACHE_SECONDS are refetched, which bounds staleness after a change made
+# by another worker.
+
+_lock = threading.Lock()
+_profiles = OrderedDict()
+
+
+def get_profile(user_id):
+    """The user's profile dict, or None if the user does not exist."""
+    with _lock:
+        entry = _profiles.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _profiles.move_to_end(user_id)
+            return entry[1]
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        forget(user_id)
+        return None
+    profile = user.to_dict()
+    with _lock:
+        _profiles[user_id] = (time.monotonic() + PROFILE_CACHE_SECONDS, profile)
+        _profiles.move_to_end(user_id)
+        while len(_profiles) > PROFILE_CACHE_SIZE:
+            _profiles.popitem(last=False)
+    return profile
+
+
+def forget(user_id):
+    with _lock:
+        _profiles.pop(user_id, None)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _forget_changed_user(mapper, connection, target):
+    forget(target.id)
@@ -0,0 +1,63 @@
+import re
+from datetime import datetime
+from sqlalchemy import event, func, select
+from .extensions import db
+from .models import ParkingLot, ParkingSpot, Reservation, User
+from .pagination import encode_cursor, reservation_page
+from .search import search_lots, search_users
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def _hot_queries():
+    """Run the controller queries that sit on hot paths, with placeholder ids."""
+    cursor = encode_cursor(Reservation(id=1, booking_timestamp=datetime(2025, 1, 1)))
+    page_args = {'limit': '50', 'cursor': cursor}
+
+    ParkingSpot.claim(1, 1)
+    ParkingSpot.query.filter_by(lot_id=1).order_by(ParkingSpot.spot_number).all()
+    spots_to_remove = select(ParkingSpot.id).where(ParkingSpot.lot_id == 1)\
+        .order_by(ParkingSpot.spot_number.desc()).limit(10).scalar_subquery()
+    db.session.query(ParkingSpot.status, func.count(ParkingSpot.id))\
+        .filter(ParkingSpot.id.in_(spots_to_remove)).group_by(ParkingSpot.status).all()
+    ParkingSpot.bulk_delete(spots_to_remove)
+
+    reservation_page(Reservation.eager(Reservation.query.filter_by(user_id=1)), page_args)
+    reservation_page(Reservation.eager(Reservation.query), page_args, allow_user_filter=True)
+    reservation_page(Reservation.eager(Reservation.query), dict(page_args, user_id='1', active='true'), allow_user_filter=True)
+    reservation_page(Reservation.eager(Reservation.query), dict(page_args, lot_id='1'), allow_user_filter=True)
+    Reservation.query.filter_by(id=1, user_id=1, is_active=True).first()
+    Reservation.query.filter_by(user_id=1, is_active=False).first()
+    Reservation.expire_stale(datetime(2025, 1, 1), datetime(2025, 1, 1), 10)
+
+    User.query.filter_by(role='user').all()
+    User.query.filter_by(username='admin').first()
+    db.session.get(ParkingLot, 1)
+    search_lots('main street', 50, 50)
+    search_users('admin', 50, 0)
+
+
+def check_query_plans():
+    """EXPLAIN every hot-path statement and report full table scans.
+
+    The queries run inside a transaction that is rolled back, so this is safe
+    against a live database. Returns a list of (statement, plan_lines, full_scans).
+    """
+    connection = db.session.connection()
+    plans = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            return
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        lines = [row[-1] for row in cursor.fetchall()]
+        scans = [match.group(1) for match in map(FULL_SCAN.match, lines) if match]
+        plans.append((statement, lines, scans))
+
+    event.listen(connection, 'before_cursor_execute', explain)
+    try:
+        _hot_queries()
+    finally:
+        event.remove(connection, 'before_cursor_execute', explain)
+        db.session.rollback()
+    return plans
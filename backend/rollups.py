@@ -0,0 +1,83 @@
+from collections import Counter
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .extensions import db
+from .models import DailyLotStat, DailyUserStat, ParkingSpot, Reservation
+
+
+def _occupied_hours(reservation):
+    if not reservation.parking_timestamp or not reservation.leaving_timestamp:
+        return 0.0
+    duration = reservation.leaving_timestamp.replace(tzinfo=None) - reservation.parking_timestamp.replace(tzinfo=None)
+    return max(0.0, duration.total_seconds() / 3600)
+
+
+def _upsert(model, keys, rows):
+    """One INSERT ... ON CONFLICT that adds every non-key value of `rows` onto the existing totals."""
+    stmt = sqlite_insert(model).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: getattr(model, name) + stmt.excluded[name] for name in rows[0] if name not in keys}
+    )
+
+
+def record_closed_reservation(reservation, lot_id):
+    """Add a just-closed reservation to the daily rollups, in the caller's transaction."""
+    totals = {
+        'bookings': 1,
+        'revenue': reservation.parking_cost or 0.0,
+        'occupied_hours': _occupied_hours(reservation),
+        'cancellations': 0 if reservation.parking_timestamp else 1,
+    }
+    day = reservation.leaving_timestamp.date()
+    db.session.execute(_upsert(DailyLotStat, ('day', 'lot_id'), [dict(totals, day=day, lot_id=lot_id)]))
+    db.session.execute(_upsert(DailyUserStat, ('day', 'user_id', 'lot_id'),
+                               [dict(totals, day=day, user_id=reservation.user_id, lot_id=lot_id)]))
+
+
+def record_expired_reservations(expired, day):
+    """Count expired bookings, given as (user_id, lot_id) pairs, as cancellations on `day`."""
+    if not expired:
+        return
+    by_lot = Counter(lot_id for _, lot_id in expired)
+    by_user = Counter(expired)
+    empty = {'revenue': 0.0, 'occupied_hours': 0.0}
+    db.session.execute(_upsert(DailyLotStat, ('day', 'lot_id'), [
+        dict(empty, day=day, lot_id=lot_id, bookings=n, cancellations=n) for lot_id, n in by_lot.items()
+    ]))
+    db.session.execute(_upsert(DailyUserStat, ('day', 'user_id', 'lot_id'), [
+        dict(empty, day=day, user_id=user_id, lot_id=lot_id, bookings=n, cancellations=n)
+        for (user_id, lot_id), n in by_user.items()
+    ]))
+
+
+def backfill_rollups():
+    """Rebuild both rollup tables from the closed reservations with two INSERT ... SELECTs."""
+    day = func.date(Reservation.leaving_timestamp)
+    hours = case(
+        (Reservation.parking_timestamp.isnot(None),
+         (func.julianday(Reservation.leaving_timestamp) - func.julianday(Reservation.parking_timestamp)) * 24),
+        else_=0.0
+    )
+    totals = [
+        func.count(Reservation.id),
+        func.coalesce(func.sum(Reservation.parking_cost), 0.0),
+        func.coalesce(func.sum(hours), 0.0),
+        func.sum(case((Reservation.parking_timestamp.is_(None), 1), else_=0)),
+    ]
+    closed = select().select_from(Reservation).join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)\
+        .where(Reservation.is_active == False, Reservation.leaving_timestamp.isnot(None))
+    total_columns = ['bookings', 'revenue', 'occupied_hours', 'cancellations']
+
+    db.session.execute(delete(DailyLotStat))
+    db.session.execute(delete(DailyUserStat))
+    db.session.execute(insert(DailyLotStat).from_select(
+        ['day', 'lot_id'] + total_columns,
+        closed.add_columns(day, ParkingSpot.lot_id, *totals).group_by(day, ParkingSpot.lot_id)
+    ))
+    db.session.execute(insert(DailyUserStat).from_select(
+        ['day', 'user_id', 'lot_id'] + total_columns,
+        closed.add_columns(day, Reservation.user_id, ParkingSpot.lot_id, *totals)
+        .group_by(day, Reservation.user_id, ParkingSpot.lot_id)
+    ))
+    db.session.commit()
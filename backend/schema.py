@@ -0,0 +1,38 @@
+from sqlalchemy import inspect
+from .extensions import db
+from .models.models import FTS_UPDATE_TRIGGERS
+
+
+def upgrade_schema():
+    """Bring an existing database file up to date with the models.
+
+    db.create_all() only creates missing tables, so columns and indexes added
+    to tables that already exist are applied here, and FTS update triggers
+    created before they were narrowed to the indexed columns are replaced.
+    Returns the added columns as "table.column" strings.
+    """
+    inspector = inspect(db.engine)
+    added_columns = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=connection.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+                connection.exec_driver_sql(ddl)
+                added_columns.append(f"{table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+        for name, ddl in FTS_UPDATE_TRIGGERS.items():
+            current = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)
+            ).scalar()
+            if current is not None and 'UPDATE OF' not in current.upper():
+                connection.exec_driver_sql(f"DROP TRIGGER {name}")
+                connection.exec_driver_sql(ddl)
+    return added_columns
@@ -0,0 +1,78 @@
+import re
+from flask import jsonify
+from sqlalchemy import column, func, literal_column, select, table
+from .extensions import db
+from .models import ParkingLot, User
+from .pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+
+# bm25() column weights, in the column order of the FTS tables
+LOT_WEIGHTS = (10.0, 4.0, 2.0)   # location_name, address, pincode
+USER_WEIGHTS = (10.0, 4.0)       # username, email
+
+SEARCH_CACHE_TIMEOUT = 30        # seconds a search page is served from the cache
+
+
+def fts_match(query):
+    """Turn free text into an FTS5 expression where every token is a prefix term.
+
+    "main str" becomes '"main"* "str"*', i.e. both prefixes anywhere in the row,
+    rather than one phrase prefix. Returns None when the text has no tokens.
+    """
+    tokens = re.findall(r'\w+', query)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def page_args(args):
+    """Read limit/offset from the request args. Raises ValueError for malformed values."""
+    try:
+        limit = min(int(args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        offset = int(args.get('offset', 0))
+        if limit <= 0 or offset < 0:
+            raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError("limit must be a positive integer and offset a non-negative one.")
+    return limit, offset
+
+
+def _ranked(model, fts_name, weights, match, limit, offset):
+    """Join the FTS rowids to the model rows, best bm25 score first, in one statement."""
+    fts = table(fts_name, column('rowid'))
+    rank = func.bm25(literal_column(fts_name), *weights)
+    stmt = select(model).join(fts, fts.c.rowid == model.id)\
+        .where(literal_column(fts_name).match(match))\
+        .order_by(rank, model.id).limit(limit).offset(offset)
+    return db.session.execute(stmt).scalars().all()
+
+
+def search_lots(query, limit=DEFAULT_PAGE_SIZE, offset=0):
+    """Return the parking lots matching `query`, or every lot by id when it has no tokens."""
+    match = fts_match(query)
+    if match is None:
+        return ParkingLot.query.order_by(ParkingLot.id).limit(limit).offset(offset).all()
+    return _ranked(ParkingLot, 'parking_lot_fts', LOT_WEIGHTS, match, limit, offset)
+
+
+def search_users(query, limit=DEFAULT_PAGE_SIZE, offset=0):
+    """Return the users matching `query`, or every regular user by id when it has no tokens."""
+    match = fts_match(query)
+    if match is None:
+        return User.query.filter_by(role='user').order_by(User.id).limit(limit).offset(offset).all()
+    return _ranked(User, 'user_fts', USER_WEIGHTS, match, limit, offset)
+
+
+def search_response(search, args):
+    """Run `search` (search_lots or search_users) for ?q= and return one JSON page.
+
+    An empty ?q= pages through the unfiltered listing the same way. The offset of the next page, if any, is sent in the X-Next-Offset header.
+    """
+    try:
+        limit, offset = page_args(args)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    results = search(args.get('q', '').strip(), limit, offset)
+    response = jsonify([result.to_dict() for result in results])
+    if len(results) == limit:
+        response.headers['X-Next-Offset'] = str(offset + limit)
+    return response, 200
@@ -1,121 +1,202 @@
 
 import os
-import csv
-import json
-import requests
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from weasyprint import HTML
-from .extensions import celery, db
-from .models import User, Reservation
-from datetime import datetime, timedelta
-from .config import GOOGLE_CHAT_WEBHOOK_URL, SENDER_EMAIL, SENDER_APP_PASSWORD, SMTP_SERVER, SMTP_PORT
-from sqlalchemy import func
-
-
-def send_to_google_chat(webhook_url, message):
-    """Sends a message to a Google Chat webhook."""
-    headers = {'Content-Type': 'application/json; charset=UTF-8'}
-    data = json.dumps({'text': message})
-    try:
-        requests.post(webhook_url, headers=headers, data=data, timeout=10)
-        print("Successfully sent message to Google Chat.")
-        return True
-    except requests.exceptions.RequestException as e:
-        print(f"Error sending message to Google Chat: {e}")
-        return False
+import time
+import pytz
+from celery import chord
+from . import availability
+from .caching import invalidate_lots
+from .extensions import cache, celery, db
+from .exports import iter_history_csv
+from .live import publish_lots
+from .models import User, ParkingLot, ParkingSpot, Reservation, MonthlyReportDelivery, ReminderDelivery
+from datetime import date, datetime, timedelta
+from .config import (AVAILABILITY_RECHECK_SECONDS, BOOKING_EXPIRY_BATCH_SIZE, BOOKING_GRACE_MINUTES,
+                     GOOGLE_CHAT_WEBHOOK_URL, NOTIFICATION_TIMEOUT)
+from .mailer import build_message, get_mailer
+from .notifications import dispatch_pending, enqueue_notification
+from .rollups import record_expired_reservations
+from sqlalchemy import delete, exists, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+IST = pytz.timezone("Asia/Kolkata")
+
 
 def send_email(to_email, subject, html_content, attachment_path=None):
-    """Sends an email with optional attachment"""
+    """Sends an email with optional attachment over the pooled SMTP connection"""
     try:
-        msg = MIMEMultipart()
-        msg['From'] = SENDER_EMAIL
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(html_content, 'html'))
-
-        if attachment_path and os.path.exists(attachment_path):
-            with open(attachment_path, "rb") as attachment:
-                part = MIMEBase("application", "octet-stream")
-                part.set_payload(attachment.read())
-            encoders.encode_base64(part)
-            part.add_header("Content-Disposition", f"attachment; filename=\"{os.path.basename(attachment_path)}\"")
-            msg.attach(part)
-
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_APP_PASSWORD)
-            server.send_message(msg)
-            print(f"Successfully sent email to {to_email}")
-        return True
+        message = build_message(to_email, subject, html_content, attachment_path)
     except Exception as e:
         print(f"Error sending email to {to_email}: {e}")
         return False
+    return get_mailer().send(message)
+
+def send_emails(messages):
+    """Sends (to_email, subject, html_content, attachment_path) tuples as one batch; returns a bool per message"""
+    return get_mailer().send_many(build_message(*message) for message in messages)
+
+
+def new_lot_message(lot_name, address):
+    return f"📢 *New Parking Lot Available!*\n\n*Name:* {lot_name}\n*Address:* {address}\n\nBook your spot now on Park Vehicle!"
+
+def notify(message, kind='general'):
+    """Queues a chat message in the outbox and commits it."""
+    enqueue_notification(message, kind)
+    db.session.commit()
 
+@celery.task
+def dispatch_notifications():
+    """Delivers the notification outbox; a cache lock keeps overlapping beat runs from double-posting."""
+    if not cache.add('lock:notification-dispatcher', 1, timeout=NOTIFICATION_TIMEOUT * 10):
+        return "Dispatcher already running."
+    try:
+        sent, failed = dispatch_pending(GOOGLE_CHAT_WEBHOOK_URL)
+    finally:
+        cache.delete('lock:notification-dispatcher')
+    return f"Delivered {sent} notifications, {failed} failed."
+
+@celery.task
+def expire_stale_bookings():
+    """Releases spots held by bookings that were never parked within the grace period."""
+    now = datetime.now(pytz.UTC).astimezone(IST)
+    cutoff = now - timedelta(minutes=BOOKING_GRACE_MINUTES)
+    expired_count = 0
+    lot_ids = set()
+    while True:
+        expired, freed = Reservation.expire_stale(cutoff, now, BOOKING_EXPIRY_BATCH_SIZE)
+        record_expired_reservations(expired, now.date())
+        db.session.commit()
+        # Hand back exactly the freed spots; reloading the lots would also re-add spots
+        # that in-flight bookings have popped from the index but not committed yet
+        for lot_id in {spot.lot_id for spot in freed}:
+            availability.release(lot_id, [spot for spot in freed if spot.lot_id == lot_id])
+        expired_count += len(expired)
+        lot_ids.update(lot_id for _, lot_id in expired)
+        if len(expired) < BOOKING_EXPIRY_BATCH_SIZE:
+            break
+
+    if lot_ids:
+        invalidate_lots(*lot_ids)
+        publish_lots(*lot_ids)
+    print(f"Expired {expired_count} stale bookings across {len(lot_ids)} lots.")
+    return f"Expired {expired_count} bookings."
 
 @celery.task
-def announce_new_lot(lot_name, address):
-    print(f"--- Announcing New Lot: {lot_name} ---")
-    message = f"📢 *New Parking Lot Available!*\n\n*Name:* {lot_name}\n*Address:* {address}\n\nBook your spot now on Park Vehicle!"
-    send_to_google_chat(GOOGLE_CHAT_WEBHOOK_URL, message)
-    return "Announcement sent."
+def check_availability_index():
+    """Repairs the lots whose live availability index disagrees with parking_spots.
+
+    A booking between its pop from the index and its commit looks like drift, so
+    only differences still there after AVAILABILITY_RECHECK_SECONDS are repaired.
+    """
+    drift = availability.check_consistency()
+    if drift:
+        time.sleep(AVAILABILITY_RECHECK_SECONDS)
+        drift = availability.persistent_drift(drift, availability.check_consistency([lot['lot_id'] for lot in drift]))
+    if drift:
+        print(f"Availability index drifted for lots {[lot['lot_id'] for lot in drift]}, repairing.")
+        availability.repair(drift)
+    return f"Repaired {len(drift)} lots."
+
+REMINDER_CHUNK_SIZE = 500
+REMINDER_RATE_LIMIT = '30/m'  # reminder chunks started per worker per minute
+
+
+def iter_inactive_user_ids(since, day, page_size=REMINDER_CHUNK_SIZE):
+    """Yields pages of ids of users with no booking since `since` who were not yet reminded on `day`.
+
+    Keyset-paged on users.id; the NOT EXISTS probes use the (user_id, booking_timestamp)
+    index and the reminder ledger's primary key.
+    """
+    recent_booking = exists().where(Reservation.user_id == User.id, Reservation.booking_timestamp >= since)
+    reminded = exists().where(ReminderDelivery.user_id == User.id, ReminderDelivery.day == day)
+    last_id = 0
+    while True:
+        page = [user_id for (user_id,) in db.session.query(User.id)
+                .filter(User.role == 'user', User.id > last_id, ~recent_booking, ~reminded)
+                .order_by(User.id).limit(page_size)]
+        if not page:
+            return
+        yield page
+        last_id = page[-1]
 
 @celery.task
 def send_daily_reminders():
     print("--- Running Daily Reminder Task ---")
     seven_days_ago = datetime.now() - timedelta(days=7) 
-    last_booking_subquery = db.session.query(Reservation.user_id, func.max(Reservation.booking_timestamp).label('last_booking')).group_by(Reservation.user_id).subquery()
-    inactive_users = db.session.query(User).outerjoin(last_booking_subquery, User.id == last_booking_subquery.c.user_id).filter((last_booking_subquery.c.last_booking < seven_days_ago) | (last_booking_subquery.c.last_booking == None)).filter(User.role == 'user').all()
+    today = datetime.now().date()
+    pages = list(iter_inactive_user_ids(seven_days_ago, today))
 
-    if not inactive_users:
+    if not pages:
         print("No inactive users found to remind.")
-        send_to_google_chat(GOOGLE_CHAT_WEBHOOK_URL, "✅ Daily reminder job ran successfully. No inactive users found.")
+        notify("✅ Daily reminder job ran successfully. No inactive users found.", kind='job_summary')
         return "No inactive users."
 
-    email_subject = "A Friendly Reminder from Park Vehicle"
-    
-    
-    sent_count = 0
-    for user in inactive_users:
-        email_html = f"""<html>
-        <body>
-        <p>Hi {user.username},</p><p>It's been a while since your last booking. Don't forget to reserve a spot on Park Vehicle if you need one!</p><p>Best,<br>The Parking Vehicle Team
-        </p>
-        </body>
-        </html>"""
-        if send_email(user.email, email_subject, email_html):
-            sent_count += 1
-    
-    summary_message = f"✅ Daily reminder job finished.\nSent emails to {sent_count}/{len(inactive_users)} inactive users."
-    send_to_google_chat(GOOGLE_CHAT_WEBHOOK_URL, summary_message)
+    user_count = sum(len(page) for page in pages)
+    print(f"Dispatching reminders for {user_count} inactive users in {len(pages)} chunks.")
+    chord(
+        send_reminder_chunk.s(today.isoformat(), page) for page in pages
+    )(finish_daily_reminders.s(user_count))
+    return f"Dispatched {len(pages)} reminder chunks for {user_count} users."
+
+def release_reminder_claims(day, user_ids):
+    """Deletes ledger claims of reminders that were not delivered, so a later run can send them."""
+    db.session.execute(delete(ReminderDelivery).where(
+        ReminderDelivery.day == date.fromisoformat(day), ReminderDelivery.user_id.in_(user_ids)))
+    db.session.commit()
+
+@celery.task(bind=True, rate_limit=REMINDER_RATE_LIMIT, autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def send_reminder_chunk(self, day, user_ids):
+    """Reminds one chunk of users. Each user is claimed in the ledger before sending,
+    so a retried chunk never reminds anyone twice on the same day."""
+    claimed = db.session.execute(
+        sqlite_insert(ReminderDelivery)
+        .values([{'day': date.fromisoformat(day), 'user_id': user_id} for user_id in user_ids])
+        .on_conflict_do_nothing()
+        .returning(ReminderDelivery.user_id)
+    ).scalars().all()
+    db.session.commit()
+    if not claimed:
+        return 0
+
+    try:
+        users = db.session.query(User.id, User.username, User.email).filter(User.id.in_(claimed)).order_by(User.id).all()
+        email_subject = "A Friendly Reminder from Park Vehicle"
+        messages = []
+        for user in users:
+            email_html = f"""<html>
+            <body>
+            <p>Hi {user.username},</p><p>It's been a while since your last booking. Don't forget to reserve a spot on Park Vehicle if you need one!</p><p>Best,<br>The Parking Vehicle Team
+            </p>
+            </body>
+            </html>"""
+            messages.append((user.email, email_subject, email_html))
+
+        results = send_emails(messages)
+    except Exception:
+        # Give the claims back before autoretry runs the chunk again, or it would find nobody left to remind
+        db.session.rollback()
+        release_reminder_claims(day, claimed)
+        raise
+
+    failed = [user.id for user, sent in zip(users, results) if not sent]
+    if failed:
+        # Release the claims of undelivered reminders so tomorrow's run (or a manual re-run) can retry them
+        release_reminder_claims(day, failed)
+    return len(users) - len(failed)
+
+@celery.task
+def finish_daily_reminders(chunk_results, user_count):
+    sent_count = sum(chunk_results)
+    summary_message = f"✅ Daily reminder job finished.\nSent emails to {sent_count}/{user_count} inactive users."
+    notify(summary_message, kind='job_summary')
     
     print("--- Daily Reminder Task Finished ---")
     return f"Sent reminders to {sent_count} users."
 
-@celery.task
-def send_monthly_reports():
-    print("--- Running Monthly Report Task ---")
-    users = User.query.filter_by(role='user').all()
-    report_dir = os.path.join(os.path.abspath(os.path.dirname(__name__)), 'reports')
-    os.makedirs(report_dir, exist_ok=True)
-
-    for user in users:
-        last_month = datetime.now() - timedelta(days=30)
-        reservations = Reservation.query.filter(Reservation.user_id == user.id, Reservation.is_active == False, Reservation.parking_timestamp >= last_month).all()
+REPORT_BATCH_SIZE = 200
 
-        total_spent = sum(r.parking_cost for r in reservations if r.parking_cost)
-        spots_booked = len(reservations)
-        
-        lot_counts = {}
-        for r in reservations:
-            if r.spot and r.spot.lot:
-                lot_counts[r.spot.lot.location_name] = lot_counts.get(r.spot.lot.location_name, 0) + 1
-        most_used_lot = max(lot_counts, key=lot_counts.get) if lot_counts else "N/A"
 
-        report_html = f"""
+def render_report_html(summary):
+    return f"""
         <html>
         <head>
         <style>
@@ -126,31 +207,112 @@ def send_monthly_reports():
         </style>
         </head>
         <body>
-        <h1>Monthly Parking Report for {user.username}</h1>
-        <p>Hi {user.username},</p>
+        <h1>Monthly Parking Report for {summary['username']}</h1>
+        <p>Hi {summary['username']},</p>
         <p>Here is your activity summary for the last 30 days:</p>
         <ul>
-            <li><b>Total Spots Booked:</b> {spots_booked}</li>
-            <li><b>Total Amount Spent:</b> ₹{total_spent:.2f}</li>
-            <li><b>Most Used Parking Lot:</b> {most_used_lot}</li>
+            <li><b>Total Spots Booked:</b> {summary['spots_booked']}</li>
+            <li><b>Total Amount Spent:</b> ₹{summary['total_spent']:.2f}</li>
+            <li><b>Most Used Parking Lot:</b> {summary['most_used_lot']}</li>
         </ul>
         <p>Thank you for using Park Vehicle!</p>
         </body>
         </html>
         """
-        
-        pdf_filename = f"{user.username}_report_{datetime.now().strftime('%Y_%m')}.pdf"
+
+
+def monthly_usage_by_user(since):
+    """Per-user booking totals since `since` from one grouped query: {user_id: (spots, spent, most_used_lot)}."""
+    rows = db.session.query(
+        Reservation.user_id,
+        ParkingLot.location_name,
+        func.count(Reservation.id),
+        func.coalesce(func.sum(Reservation.parking_cost), 0.0)
+    ).join(ParkingSpot, ParkingSpot.id == Reservation.spot_id)\
+     .join(ParkingLot, ParkingLot.id == ParkingSpot.lot_id)\
+     .filter(Reservation.is_active == False, Reservation.parking_timestamp >= since)\
+     .group_by(Reservation.user_id, ParkingLot.location_name).all()
+
+    usage = {}
+    for user_id, location_name, bookings, spent in rows:
+        spots, total, lot_counts = usage.setdefault(user_id, (0, 0.0, {}))
+        lot_counts[location_name] = bookings
+        usage[user_id] = (spots + bookings, total + spent, lot_counts)
+    return {
+        user_id: (spots, total, max(lot_counts, key=lot_counts.get))
+        for user_id, (spots, total, lot_counts) in usage.items()
+    }
+
+
+@celery.task
+def send_monthly_reports():
+    print("--- Running Monthly Report Task ---")
+    period = datetime.now().strftime('%Y-%m')
+    usage = monthly_usage_by_user(datetime.now() - timedelta(days=30))
+
+    delivered = db.session.query(MonthlyReportDelivery.user_id).filter(MonthlyReportDelivery.period == period)
+    pending_users = db.session.query(User.id, User.username, User.email)\
+        .filter(User.role == 'user', ~User.id.in_(delivered)).order_by(User.id)
+
+    batches = []
+    for user_id, username, email in pending_users.yield_per(REPORT_BATCH_SIZE):
+        spots_booked, total_spent, most_used_lot = usage.get(user_id, (0, 0.0, "N/A"))
+        if not batches or len(batches[-1]) == REPORT_BATCH_SIZE:
+            batches.append([])
+        batches[-1].append({'id': user_id, 'username': username, 'email': email, 'spots_booked': spots_booked,
+                            'total_spent': total_spent, 'most_used_lot': most_used_lot})
+
+    if not batches:
+        print(f"All monthly reports for {period} were already delivered.")
+        return "No pending reports."
+
+    pending_count = sum(len(batch) for batch in batches)
+    print(f"Dispatching {pending_count} reports for {period} in {len(batches)} batches.")
+    chord(
+        send_report_batch.s(period, index, batch) for index, batch in enumerate(batches, start=1)
+    )(finish_monthly_reports.s(period, pending_count))
+    return f"Dispatched {len(batches)} report batches for {pending_count} users."
+
+@celery.task(bind=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def send_report_batch(self, period, batch_index, summaries):
+    """Renders and mails one batch of reports, recording each delivery so a retry resumes where it stopped."""
+    # Imported here so the web app can import the tasks without Pango installed
+    from weasyprint import HTML
+    report_dir = os.path.join(os.path.abspath(os.path.dirname(__name__)), 'reports')
+    os.makedirs(report_dir, exist_ok=True)
+    already_delivered = {user_id for (user_id,) in db.session.query(MonthlyReportDelivery.user_id).filter(
+        MonthlyReportDelivery.period == period,
+        MonthlyReportDelivery.user_id.in_([summary['id'] for summary in summaries])
+    )}
+
+    email_subject = "Your Park Vehicle Monthly Report"
+    pending = [summary for summary in summaries if summary['id'] not in already_delivered]
+    messages = []
+    for summary in pending:
+        report_html = render_report_html(summary)
+        pdf_filename = f"{summary['username']}_report_{period.replace('-', '_')}.pdf"
         pdf_filepath = os.path.join(report_dir, pdf_filename)
         HTML(string=report_html).write_pdf(pdf_filepath)
-        
-        email_subject = "Your Park Vehicle Monthly Report"
-        send_email(user.email, email_subject, report_html, attachment_path=pdf_filepath)
+        messages.append((summary['email'], email_subject, report_html, pdf_filepath))
 
-    summary_message = f"✅ Monthly report job finished.\nProcessed and sent reports for {len(users)} users."
-    send_to_google_chat(GOOGLE_CHAT_WEBHOOK_URL, summary_message)
+    sent_count = 0
+    for summary, sent in zip(pending, send_emails(messages)):
+        if sent:
+            db.session.add(MonthlyReportDelivery(period=period, user_id=summary['id']))
+            sent_count += 1
+    db.session.commit()
+
+    print(f"Monthly reports {period}, batch {batch_index}: sent {sent_count}/{len(summaries)}.")
+    return sent_count
+
+@celery.task
+def finish_monthly_reports(batch_results, period, pending_count):
+    delivered_count = MonthlyReportDelivery.query.filter_by(period=period).count()
+    summary_message = f"✅ Monthly report job finished.\nSent reports to {sum(batch_results)}/{pending_count} users in this run ({delivered_count} delivered for {period} so far)."
+    notify(summary_message, kind='job_summary')
 
     print("--- Monthly Report Task Finished ---")
-    return f"Generated reports for {len(users)} users."
+    return f"Generated reports for {sum(batch_results)} users."
 
 @celery.task
 def export_csv_task(user_id):
@@ -158,20 +320,14 @@ def export_csv_task(user_id):
     user = User.query.get(user_id)
     if not user: return
         
-    history = Reservation.query.filter_by(user_id=user_id, is_active=False).order_by(Reservation.booking_timestamp.desc()).all()
     export_dir = os.path.join(os.path.abspath(os.path.dirname(__name__)), 'exports')
     os.makedirs(export_dir, exist_ok=True)
     filename = f"{user.username}_parking_history_{datetime.now().strftime('%Y%m%d')}.csv"
     filepath = os.path.join(export_dir, filename)
 
-    headers = ['Lot Name', 'Spot Number', 'Booked On', 'Parked On', 'Left On', 'Cost (INR)']
     with open(filepath, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(headers)
-        for r in history:
-            lot_name = r.spot.lot.location_name if r.spot and r.spot.lot else 'N/A'
-            spot_number = r.spot.spot_number if r.spot else 'N/A'
-            writer.writerow([lot_name, spot_number, r.booking_timestamp.strftime('%Y-%m-%d %H:%M:%S'), r.parking_timestamp.strftime('%Y-%m-%d %H:%M:%S') if r.parking_timestamp else 'N/A', r.leaving_timestamp.strftime('%Y-%m-%d %H:%M:%S') if r.leaving_timestamp else 'N/A', f"{r.parking_cost:.2f}" if r.parking_cost is not None else '0.00'])
+        for chunk in iter_history_csv(user_id):
+            csvfile.write(chunk)
     
     email_subject = "Your Park Vehicle History Export"
     email_body = f"""<html>
@@ -182,7 +338,7 @@ def export_csv_task(user_id):
     send_email(user.email, email_subject, email_body, attachment_path=filepath)
     
     completion_message = f"✅ Hi {user.username}, your CSV export is complete and has been sent to your email: {user.email}."
-    send_to_google_chat(GOOGLE_CHAT_WEBHOOK_URL, completion_message)
+    notify(completion_message, kind='export')
 
     print(f"--- CSV Export for User ID: {user_id} finished. ---")
     return f"Export successful for {user.username}."
@@ -0,0 +1,19 @@
+"""Production entrypoint with gevent, so each open /api/lots/stream costs a greenlet, not a thread.
+
+    gunicorn -k gevent -w 4 --worker-connections 1000 -b 0.0.0.0:5000 backend.wsgi:app
+    python -m backend.wsgi        # single process, gevent's WSGI server
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os
+from .app import create_app
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    from gevent.pywsgi import WSGIServer
+
+    WSGIServer(('0.0.0.0', int(os.environ.get('PORT', 5000))), app).serve_forever()
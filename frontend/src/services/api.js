@@ -2,16 +2,65 @@ import { ref } from 'vue';
 
 const API_URL = 'http://127.0.0.1:5000/api';
 
-export const auth = ref({
+const storedAuth = () => ({
     token: localStorage.getItem('token') || null,
+    refreshToken: localStorage.getItem('refreshToken') || null,
     role: localStorage.getItem('role') || null,
     username: localStorage.getItem('username') || null,
 });
 
-export async function apiRequest(endpoint, method = 'GET', data = null) {
+export const auth = ref(storedAuth());
+
+// Tabs share localStorage but each keeps its own copy in `auth`; follow the other tabs'
+// logins, logouts and token rotations so no tab keeps spending a refresh token already used
+window.addEventListener('storage', (event) => {
+    if (event.key === null || ['token', 'refreshToken', 'role', 'username'].includes(event.key)) {
+        auth.value = storedAuth();
+    }
+});
+
+let refreshing = null;
+
+const ROTATION_GRACE_MS = 500;
+
+// Trade the refresh token for a new pair; concurrent 401s share one refresh call.
+// `rejectedToken` is the access token the server refused.
+async function refreshTokens(rejectedToken) {
+    const stored = storedAuth();
+    if (stored.token && stored.token !== rejectedToken) {
+        // Another tab already rotated the pair
+        auth.value = stored;
+        return true;
+    }
+    if (!stored.refreshToken) return false;
+    if (!refreshing) {
+        refreshing = fetch(API_URL + '/token/refresh', {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${stored.refreshToken}` },
+        }).then(async (response) => {
+            if (response.ok) {
+                const data = await response.json();
+                setTokens(data.access_token, data.refresh_token);
+                return true;
+            }
+            // Refused because another tab spent the same refresh token first: wait for it to store the new pair
+            await new Promise((resolve) => setTimeout(resolve, ROTATION_GRACE_MS));
+            const current = storedAuth();
+            if (current.refreshToken && current.refreshToken !== stored.refreshToken) {
+                auth.value = current;
+                return true;
+            }
+            return false;
+        }).catch(() => false).finally(() => { refreshing = null; });
+    }
+    return refreshing;
+}
+
+async function send(endpoint, method, data, retried = false) {
     const headers = { 'Content-Type': 'application/json' };
-    if (auth.value.token) {
-        headers['Authorization'] = `Bearer ${auth.value.token}`;
+    const sentToken = auth.value.token;
+    if (sentToken) {
+        headers['Authorization'] = `Bearer ${sentToken}`;
     }
 
     const config = { method, headers };
@@ -24,8 +73,16 @@ export async function apiRequest(endpoint, method = 'GET', data = null) {
         const responseData = await response.json();
 
         if (response.status === 401) {
+            if (!retried && endpoint !== '/login' && await refreshTokens(sentToken)) {
+                return send(endpoint, method, data, true);
+            }
             if (window.location.pathname !== '/login'){
-                logout();
+                // Leave the shared storage alone if another tab has stored a newer session meanwhile
+                if (localStorage.getItem('token') === sentToken) {
+                    logout();
+                } else {
+                    auth.value = { token: null, refreshToken: null, role: null, username: null };
+                }
                 window.location.href = '/login';
                 throw new Error("Session expired. Please log in again.");
             }    
@@ -33,23 +90,62 @@ export async function apiRequest(endpoint, method = 'GET', data = null) {
         if (!response.ok) {
             throw new Error(responseData.msg || 'An API error occurred');
         }
-        return responseData;
+        return { response, responseData };
     } catch (error) {
         console.error("API Request Error:", error);
         throw error;
     }
 }
 
-export function login(token, role, username) {
-    auth.value = { token, role, username };
+export async function apiRequest(endpoint, method = 'GET', data = null) {
+    const { responseData } = await send(endpoint, method, data);
+    return responseData;
+}
+
+export function withParam(endpoint, name, value) {
+    return `${endpoint}${endpoint.includes('?') ? '&' : '?'}${name}=${encodeURIComponent(value)}`;
+}
+
+// One page of a paged listing; nextCursor/nextOffset are null on the last page
+export async function apiPage(endpoint) {
+    const { response, responseData } = await send(endpoint, 'GET', null);
+    return {
+        items: responseData,
+        nextCursor: response.headers.get('X-Next-Cursor'),
+        nextOffset: response.headers.get('X-Next-Offset'),
+    };
+}
+
+// Every row of a cursor-paged listing
+export async function apiFetchAll(endpoint) {
+    const rows = [];
+    let page = await apiPage(endpoint);
+    rows.push(...page.items);
+    while (page.nextCursor) {
+        page = await apiPage(withParam(endpoint, 'cursor', page.nextCursor));
+        rows.push(...page.items);
+    }
+    return rows;
+}
+
+function setTokens(token, refreshToken) {
+    auth.value = { ...auth.value, token, refreshToken };
+    localStorage.setItem('token', token);
+    localStorage.setItem('refreshToken', refreshToken);
+}
+
+export function login(token, role, username, refreshToken) {
+    auth.value = { token, refreshToken, role, username };
     localStorage.setItem('token', token);
+    localStorage.setItem('refreshToken', refreshToken);
     localStorage.setItem('role', role);
     localStorage.setItem('username', username);
 }
 
 export function logout() {
-    auth.value = { token: null, role: null, username: null };
+    auth.value = { token: null, refreshToken: null, role: null, username: null };
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
     localStorage.removeItem('role');
     localStorage.removeItem('username');
 }
\ No newline at end of file
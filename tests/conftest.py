@@ -0,0 +1,47 @@
+"""Fixtures for the backend tests.
+
+Install the test dependencies with ``pip install -r requirements-dev.txt`` (pytest,
+fakeredis[lua] for the Redis-backed tests and aiosmtpd for the mailer tests), then
+run ``python -m pytest tests`` from the repository root.
+"""
+import pytest
+from sqlalchemy import event
+from backend.benchmarks.common import auth_headers, make_app, seed_users
+from backend.extensions import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    return make_app(str(tmp_path / 'test.db'))
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        return seed_users(1)[0]
+
+
+@pytest.fixture
+def headers(app, user_id):
+    with app.app_context():
+        return {'admin': auth_headers(1, role='admin'), 'user': auth_headers(user_id)}
+
+
+@pytest.fixture
+def statements(app):
+    """Collects the SQL statements the app's engine executes while the test runs."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
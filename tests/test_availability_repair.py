@@ -0,0 +1,74 @@
+"""Expiry and the consistency check must not re-add spots that in-flight bookings have popped."""
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from sqlalchemy import update
+from backend import availability, tasks
+from backend.benchmarks.common import auth_headers, fake_redis_config, make_app, seed_lots, seed_users
+from backend.extensions import cache, db
+from backend.models import ParkingSpot, Reservation
+
+pytest.importorskip('lupa')
+
+
+@pytest.fixture
+def indexed(tmp_path):
+    app = make_app(str(tmp_path / 'indexed.db'), **fake_redis_config())
+    with app.app_context():
+        lot_id = seed_lots(1, 5)[0]
+        availability.rebuild()
+        headers = auth_headers(seed_users(1)[0])
+    return app, headers, lot_id
+
+
+def _indexed_ids(lot_id):
+    return {int(member) for member in cache.cache._write_client.zrange(availability._free_key(lot_id), 0, -1)}
+
+
+def _pop_in_flight(lot_id):
+    """A booking that has taken a spot from the index but not committed its claim yet."""
+    return int(cache.cache._write_client.zpopmin(availability._free_key(lot_id))[0][0])
+
+
+def test_expiry_releases_only_the_spots_it_freed(indexed):
+    app, headers, lot_id = indexed
+    booked = app.test_client().post('/api/user/reservations/book', headers=headers, json={'lot_id': lot_id})
+    reservation = booked.get_json()['reservations'][0]
+    with app.app_context():
+        db.session.execute(update(Reservation).where(Reservation.id == reservation['id'])
+                           .values(booking_timestamp=datetime.now(pytz.UTC) - timedelta(days=1)))
+        db.session.commit()
+        in_flight = _pop_in_flight(lot_id)
+
+        tasks.expire_stale_bookings()
+
+        indexed_ids = _indexed_ids(lot_id)
+        assert reservation['spot_id'] in indexed_ids
+        assert in_flight not in indexed_ids
+
+
+def test_consistency_check_ignores_drift_that_settles(indexed, monkeypatch):
+    app, _, lot_id = indexed
+    with app.app_context():
+        in_flight = _pop_in_flight(lot_id)
+
+        def booking_commits(seconds):
+            ParkingSpot.claim_ids([in_flight])
+            db.session.commit()
+
+        monkeypatch.setattr(tasks.time, 'sleep', booking_commits)
+        tasks.check_availability_index()
+
+        assert in_flight not in _indexed_ids(lot_id)
+        assert availability.check_consistency() == []
+
+
+def test_consistency_check_repairs_drift_that_persists(indexed, monkeypatch):
+    app, _, lot_id = indexed
+    with app.app_context():
+        lost = _pop_in_flight(lot_id)
+        monkeypatch.setattr(tasks.time, 'sleep', lambda seconds: None)
+        tasks.check_availability_index()
+
+        assert lost in _indexed_ids(lot_id)
+        assert availability.check_consistency() == []
@@ -0,0 +1,35 @@
+import pytest
+from backend import availability
+from backend.benchmarks.common import auth_headers, fake_redis_config, make_app, seed_lots, seed_users
+from backend.extensions import cache
+
+pytest.importorskip('lupa')
+
+
+@pytest.fixture
+def indexed_app(tmp_path):
+    app = make_app(str(tmp_path / 'indexed.db'), **fake_redis_config())
+    with app.app_context():
+        lot_ids = seed_lots(2, 5)
+        availability.rebuild()
+        headers = auth_headers(seed_users(1)[0])
+        # A claim in flight: the index has handed out a spot the counter still shows as free
+        cache.cache._write_client.zpopmin(availability._free_key(lot_ids[0]))
+    return app, headers, lot_ids
+
+
+def test_bulk_booking_takes_what_a_lagging_lot_has(indexed_app):
+    app, headers, _ = indexed_app
+    response = app.test_client().post('/api/user/reservations/bulk-book', headers=headers,
+                                      json={'number_of_spots': 9})
+
+    assert response.status_code == 201
+    assert len(response.get_json()['reservations']) == 9
+
+
+def test_partial_claim_returns_the_free_spots_left(indexed_app):
+    app, _, lot_ids = indexed_app
+    with app.app_context():
+        lot_id = lot_ids[0]
+        assert availability.claim(lot_id, 5) == []
+        assert len(availability.claim(lot_id, 5, partial=True)) == 4
@@ -0,0 +1,53 @@
+"""cached_view's fill lock is only ever released by the worker holding it."""
+from backend.extensions import cache
+
+
+def test_timed_out_waiter_keeps_the_holders_lock(app, client, headers, monkeypatch):
+    app.config['CACHE_FILL_WAIT'] = 0
+    real_add = cache.add
+    locks = []
+
+    def held_elsewhere(key, value, timeout=None):
+        locks.append(key)
+        real_add(key, 'other-worker', timeout=timeout)
+        return False
+
+    monkeypatch.setattr(cache, 'add', held_elsewhere)
+    assert client.get('/api/user/lots', headers=headers['user']).status_code == 200
+    monkeypatch.undo()
+
+    with app.app_context():
+        assert [cache.get(key) for key in locks] == ['other-worker']
+
+
+def test_holder_releases_its_lock(app, client, headers, monkeypatch):
+    real_add = cache.add
+    locks = []
+
+    def recording_add(key, value, timeout=None):
+        locks.append(key)
+        return real_add(key, value, timeout=timeout)
+
+    monkeypatch.setattr(cache, 'add', recording_add)
+    assert client.get('/api/user/lots', headers=headers['user']).status_code == 200
+    monkeypatch.undo()
+
+    with app.app_context():
+        assert locks and all(cache.get(key) is None for key in locks)
+
+
+def test_stale_copies_of_short_lived_views_expire_soon(app, client, headers, monkeypatch):
+    timeouts = {}
+    real_set = cache.set
+
+    def recording_set(key, value, timeout=None):
+        timeouts[key.split(':')[0]] = timeout
+        return real_set(key, value, timeout=timeout)
+
+    monkeypatch.setattr(cache, 'set', recording_set)
+    assert client.get('/api/user/lots/search?q=lot', headers=headers['user']).status_code == 200
+    assert timeouts == {'view': 30, 'stale': 300}
+
+    timeouts.clear()
+    assert client.get('/api/user/lots', headers=headers['user']).status_code == 200
+    assert timeouts == {'view': None, 'stale': 6000}
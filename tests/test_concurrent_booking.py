@@ -0,0 +1,55 @@
+"""Parallel book_spot calls on one lot never hand a spot out twice and keep the lot counters exact."""
+import random
+import threading
+from sqlalchemy import func
+from backend.benchmarks.common import auth_headers, seed_lots, seed_users
+from backend.extensions import db
+from backend.models import ParkingLot, ParkingSpot, Reservation
+
+THREADS = 8
+SPOTS = 60
+
+
+def test_parallel_bookings_fill_the_lot_exactly_once(app):
+    with app.app_context():
+        lot_id = seed_lots(1, SPOTS)[0]
+        headers = [auth_headers(user_id) for user_id in seed_users(THREADS)]
+
+    booked = []
+    errors = []
+    lock = threading.Lock()
+
+    def book_until_full(index):
+        client = app.test_client()
+        rng = random.Random(index)
+        while True:
+            count = rng.randint(1, 3)
+            response = client.post('/api/user/reservations/book', headers=headers[index],
+                                   json={'lot_id': lot_id, 'number_of_spots': count})
+            if response.status_code == 201:
+                with lock:
+                    booked.append(count)
+            elif response.status_code != 404:
+                with lock:
+                    errors.append(response.status_code)
+                return
+            elif count == 1:
+                return
+
+    workers = [threading.Thread(target=book_until_full, args=(i,)) for i in range(THREADS)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    assert errors == []
+    assert sum(booked) == SPOTS
+    with app.app_context():
+        double_allocated = db.session.query(Reservation.spot_id)\
+            .filter(Reservation.is_active == True)\
+            .group_by(Reservation.spot_id).having(func.count(Reservation.id) > 1).count()
+        lot = db.session.get(ParkingLot, lot_id)
+        assert double_allocated == 0
+        assert Reservation.query.filter_by(is_active=True).count() == SPOTS
+        assert ParkingSpot.query.filter_by(lot_id=lot_id, status='Booked').count() == SPOTS
+        assert (lot.available_count, lot.booked_count, lot.occupied_count) == (0, SPOTS, 0)
@@ -0,0 +1,89 @@
+"""The expiry job committing in the middle of a park or vacate request must not corrupt spots or counters."""
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from sqlalchemy import event, update
+from backend.benchmarks.common import seed_lots
+from backend.extensions import db
+from backend.models import DailyLotStat, ParkingLot, ParkingSpot, Reservation
+from backend.tasks import expire_stale_bookings
+
+
+@pytest.fixture
+def stale_booking(app, client, headers):
+    """One booking made long before the grace period, so the expiry job will close it."""
+    with app.app_context():
+        lot_id = seed_lots(1, 4)[0]
+    response = client.post('/api/user/reservations/book', headers=headers['user'], json={'lot_id': lot_id})
+    reservation_id = response.get_json()['reservations'][0]['id']
+    with app.app_context():
+        db.session.execute(update(Reservation).where(Reservation.id == reservation_id)
+                           .values(booking_timestamp=datetime.now(pytz.UTC) - timedelta(days=1)))
+        db.session.commit()
+    return lot_id, reservation_id
+
+
+@pytest.fixture
+def expire_before_first_write(app):
+    """Runs the expiry job on its own connection right before the request's first UPDATE."""
+    ran = []
+
+    def expire(conn, cursor, statement, parameters, context, executemany):
+        if not ran and statement.lstrip().upper().startswith('UPDATE'):
+            ran.append(True)
+            with app.app_context():
+                expire_stale_bookings()
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', expire)
+    yield ran
+    event.remove(engine, 'before_cursor_execute', expire)
+
+
+def _assert_released(app, lot_id, reservation_id):
+    with app.app_context():
+        reservation = db.session.get(Reservation, reservation_id)
+        lot = db.session.get(ParkingLot, lot_id)
+        assert not reservation.is_active
+        assert db.session.get(ParkingSpot, reservation.spot_id).status == 'Available'
+        assert (lot.available_count, lot.booked_count, lot.occupied_count) == (4, 0, 0)
+        assert sum(stat.bookings for stat in DailyLotStat.query.filter_by(lot_id=lot_id)) == 1
+
+
+def test_park_loses_to_a_concurrent_expiry(app, client, headers, stale_booking, expire_before_first_write):
+    lot_id, reservation_id = stale_booking
+    response = client.put('/api/user/reservations/park', headers=headers['user'], json={'reservation_id': reservation_id})
+
+    assert expire_before_first_write
+    assert response.status_code == 404
+    _assert_released(app, lot_id, reservation_id)
+
+
+def test_cancel_loses_to_a_concurrent_expiry(app, client, headers, stale_booking, expire_before_first_write):
+    lot_id, reservation_id = stale_booking
+    response = client.put('/api/user/reservations/vacate', headers=headers['user'], json={'reservation_id': reservation_id})
+
+    assert expire_before_first_write
+    assert response.status_code == 404
+    _assert_released(app, lot_id, reservation_id)
+
+
+def test_park_and_vacate_move_the_spot_once(app, client, headers):
+    with app.app_context():
+        lot_id = seed_lots(1, 4)[0]
+    response = client.post('/api/user/reservations/book', headers=headers['user'], json={'lot_id': lot_id})
+    reservation_id = response.get_json()['reservations'][0]['id']
+
+    parked = client.put('/api/user/reservations/park', headers=headers['user'], json={'reservation_id': reservation_id})
+    assert parked.status_code == 200
+    assert parked.get_json()['reservation']['spot']['status'] == 'Occupied'
+    again = client.put('/api/user/reservations/park', headers=headers['user'], json={'reservation_id': reservation_id})
+    assert again.status_code == 400
+
+    vacated = client.put('/api/user/reservations/vacate', headers=headers['user'], json={'reservation_id': reservation_id})
+    assert vacated.status_code == 200
+    assert vacated.get_json()['reservation']['parking_cost'] > 0
+    assert client.put('/api/user/reservations/vacate', headers=headers['user'],
+                      json={'reservation_id': reservation_id}).status_code == 404
+    _assert_released(app, lot_id, reservation_id)
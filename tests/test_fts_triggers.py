@@ -0,0 +1,50 @@
+"""Counter updates on hot paths leave the FTS indexes alone; edits to indexed columns still reach them."""
+from sqlalchemy import text, update
+from backend.benchmarks.common import seed_lots
+from backend.extensions import db
+from backend.models import ParkingLot
+from backend.models.models import FTS_UPDATE_TRIGGERS
+from backend.schema import upgrade_schema
+
+
+def _fts_rows():
+    return db.session.execute(text('SELECT count(*) FROM parking_lot_fts_data')).scalar()
+
+
+def test_counter_updates_do_not_rewrite_fts(app):
+    with app.app_context():
+        lot_id = seed_lots(1, 5)[0]
+        before = _fts_rows()
+        for _ in range(50):
+            ParkingLot.shift_counts(lot_id, from_status='Available', to_status='Booked')
+            ParkingLot.shift_counts(lot_id, from_status='Booked', to_status='Available')
+        db.session.commit()
+        assert _fts_rows() == before
+
+
+def test_renamed_lot_is_found_by_its_new_name(app, client, headers):
+    with app.app_context():
+        lot_id = seed_lots(1, 5)[0]
+        db.session.execute(update(ParkingLot).where(ParkingLot.id == lot_id).values(location_name='Harbour View'))
+        db.session.commit()
+    response = client.get('/api/admin/lots/search?q=harbour', headers=headers['admin'])
+    assert [lot['id'] for lot in response.get_json()] == [lot_id]
+
+
+def test_upgrade_replaces_unfiltered_update_triggers(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP TRIGGER parking_lots_after_update')
+            connection.exec_driver_sql('''
+                CREATE TRIGGER parking_lots_after_update AFTER UPDATE ON parking_lots
+                BEGIN
+                    INSERT INTO parking_lot_fts(parking_lot_fts, rowid, location_name, address, pincode)
+                    VALUES ('delete', old.id, old.location_name, old.address, old.pincode);
+                    INSERT INTO parking_lot_fts(rowid, location_name, address, pincode)
+                    VALUES (new.id, new.location_name, new.address, new.pincode);
+                END
+            ''')
+        upgrade_schema()
+        triggers = dict(db.session.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")).all())
+        for name in FTS_UPDATE_TRIGGERS:
+            assert 'UPDATE OF' in triggers[name].upper()
@@ -0,0 +1,66 @@
+"""Every SSE stream of a process shares one Redis subscription."""
+import json
+import time
+import pytest
+from backend import live
+from backend.benchmarks.common import fake_redis_config, make_app, seed_lots
+from backend.extensions import cache
+
+pytest.importorskip('lupa')
+
+
+def _events(stream, count):
+    events = []
+    while len(events) < count:
+        chunk = next(stream)
+        if chunk.startswith('event: '):
+            name, data = chunk.split('\n')[:2]
+            events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@pytest.fixture
+def app(tmp_path):
+    return make_app(str(tmp_path / 'live.db'), **fake_redis_config())
+
+
+def test_streams_share_one_subscriber(app, monkeypatch):
+    with app.app_context():
+        lot_a, lot_b = seed_lots(2, 3)
+        client = cache.cache._write_client
+        connections = []
+        pubsub = client.pubsub
+        monkeypatch.setattr(client, 'pubsub', lambda **kwargs: connections.append(1) or pubsub(**kwargs))
+
+        everything = live.stream_lots(heartbeat=1)
+        only_b = live.stream_lots([lot_b], heartbeat=1)
+        assert _events(everything, 1)[0][0] == 'snapshot'
+        assert [lot['id'] for lot in _events(only_b, 1)[0][1]] == [lot_b]
+
+        live.publish_lots(lot_a)
+        live.publish_lots(lot_b)
+        assert [payload['id'] for _, payload in _events(everything, 2)] == [lot_a, lot_b]
+        assert [payload['id'] for _, payload in _events(only_b, 1)] == [lot_b]
+        assert len(connections) == 1
+
+        everything.close()
+        only_b.close()
+        assert not live._hub()._subscriptions
+
+
+def test_a_stream_that_falls_behind_is_closed(app, monkeypatch):
+    monkeypatch.setattr(live, 'LIVE_QUEUE_SIZE', 2)
+    with app.app_context():
+        lot_id = seed_lots(1, 3)[0]
+        stream = live.stream_lots(heartbeat=1)
+        _events(stream, 1)
+
+        for _ in range(3):
+            live.publish_lots(lot_id)
+        deadline = time.monotonic() + 2
+        while live._hub()._subscriptions and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not live._hub()._subscriptions
+        assert len(_events(stream, 2)) == 2
+        with pytest.raises(StopIteration):
+            _events(stream, 1)
@@ -0,0 +1,91 @@
+"""The pooled Mailer retries only failures a new attempt can fix, against a local aiosmtpd server."""
+import socket
+import pytest
+from backend.mailer import Mailer, build_message
+
+pytest.importorskip('aiosmtpd')
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+
+class Handler:
+    """Refuses unknown@ recipients with a 5xx, and busy@ ones once with a 4xx."""
+
+    def __init__(self):
+        self.attempts = []
+        self.received = 0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        self.attempts.append(address)
+        if address.startswith('unknown'):
+            return '550 5.1.1 No such user'
+        if address.startswith('busy') and self.attempts.count(address) == 1:
+            return '451 4.3.0 Try again later'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return '250 OK'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = Handler()
+    logins = []
+
+    def authenticator(server, session, envelope, mechanism, auth_data):
+        logins.append(auth_data.login)
+        return AuthResult(success=auth_data.login == b'sender@park.local', handled=False)
+
+    controller = Controller(handler, hostname='127.0.0.1', port=_free_port(), authenticator=authenticator,
+                            auth_require_tls=False, auth_exclude_mechanism=['LOGIN'])
+    controller.start()
+    handler.logins = logins
+    yield controller, handler
+    controller.stop()
+
+
+def _mailer(controller, username='sender@park.local'):
+    return Mailer(host=controller.hostname, port=controller.port, username=username,
+                  password='secret', use_tls=False, pool_size=1, max_retries=3, retry_backoff=0, timeout=5)
+
+
+def _message(to):
+    return build_message(to, 'Reminder', '<p>Hello</p>', sender='sender@park.local')
+
+
+def test_permanent_rejection_is_not_retried(smtp_server):
+    controller, handler = smtp_server
+    mailer = _mailer(controller)
+
+    assert mailer.send(_message('unknown@park.local')) is False
+    assert handler.attempts == ['unknown@park.local']
+    assert mailer.send(_message('driver@park.local')) is True
+    assert handler.logins == [b'sender@park.local']
+    mailer.close()
+
+
+def test_refused_login_is_not_retried(smtp_server):
+    controller, handler = smtp_server
+    mailer = _mailer(controller, username='intruder@park.local')
+
+    assert mailer.send(_message('driver@park.local')) is False
+    assert handler.logins == [b'intruder@park.local']
+    assert handler.received == 0
+
+
+def test_temporary_rejection_is_retried(smtp_server):
+    controller, handler = smtp_server
+    mailer = _mailer(controller)
+
+    assert mailer.send(_message('busy@park.local')) is True
+    assert handler.attempts == ['busy@park.local', 'busy@park.local']
+    assert handler.received == 1
+    mailer.close()
@@ -0,0 +1,32 @@
+"""Logins rehash only when the stored hash parameters differ from PASSWORD_HASH_METHOD."""
+import pytest
+from werkzeug.security import generate_password_hash
+from backend import passwords
+from backend.extensions import db
+from backend.models import User
+
+
+@pytest.mark.parametrize('method', ['scrypt', 'pbkdf2', 'pbkdf2:sha256'])
+def test_short_method_names_do_not_force_a_rehash(app, method):
+    app.config['PASSWORD_HASH_METHOD'] = method
+    with app.app_context():
+        assert not passwords.needs_rehash(generate_password_hash('secret', method=method))
+
+
+def test_login_rehashes_when_the_method_changes(app, client, user_id):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    app.config['PASSWORD_VERIFY_CACHE_SECONDS'] = 0
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        user.password_hash = generate_password_hash('secret', method='pbkdf2:sha256:2000')
+        db.session.commit()
+        username = user.username
+
+    assert client.post('/api/login', json={'username': username, 'password': 'secret'}).status_code == 200
+    with app.app_context():
+        rehashed = db.session.get(User, user_id).password_hash
+    assert rehashed.startswith('pbkdf2:sha256:1000$')
+
+    assert client.post('/api/login', json={'username': username, 'password': 'secret'}).status_code == 200
+    with app.app_context():
+        assert db.session.get(User, user_id).password_hash == rehashed
@@ -0,0 +1,46 @@
+"""The listing endpoints run a fixed number of statements however many rows they return."""
+import pytest
+from backend.benchmarks.common import seed_history, seed_lots
+from backend.extensions import cache
+
+LISTINGS = [
+    ('admin', '/api/admin/lots', 1),
+    ('user', '/api/user/lots', 1),
+    ('admin', '/api/admin/lots/search?q=bench', 1),
+    ('user', '/api/user/lots/search?q=bench', 1),
+    ('admin', '/api/admin/reservations', 1),
+    ('user', '/api/user/reservations', 1),
+]
+
+
+def _grow(app, user_id, lots, reservations):
+    with app.app_context():
+        lot_ids = seed_lots(lots, 3)
+        seed_history([user_id], lot_ids, reservations)
+        cache.clear()
+
+
+@pytest.mark.parametrize('role, url, expected', LISTINGS)
+def test_listing_statement_count_is_constant(app, client, user_id, headers, statements, role, url, expected):
+    counts = []
+    for lots, reservations in ((2, 5), (30, 120)):
+        _grow(app, user_id, lots, reservations)
+        statements.clear()
+        response = client.get(url, headers=headers[role])
+        assert response.status_code == 200
+        assert response.get_json()
+        counts.append(len(statements))
+
+    assert counts == [expected, expected]
+
+
+def test_booking_shows_up_in_listings_without_extra_statements(app, client, headers, statements):
+    with app.app_context():
+        lot_id = seed_lots(5, 4)[0]
+    assert client.post('/api/user/reservations/book', headers=headers['user'],
+                       json={'lot_id': lot_id, 'number_of_spots': 3}).status_code == 201
+
+    statements.clear()
+    response = client.get('/api/user/reservations', headers=headers['user'])
+    assert len(response.get_json()) == 3
+    assert len(statements) == 1
@@ -0,0 +1,10 @@
+"""No hot-path statement falls back to a full table scan."""
+from backend.query_plans import check_query_plans
+
+
+def test_hot_queries_use_indexes(app):
+    with app.app_context():
+        plans = check_query_plans()
+    assert plans
+    scans = [(statement, lines) for statement, lines, full_scans in plans if full_scans]
+    assert scans == []
@@ -0,0 +1,22 @@
+"""A reminder chunk that fails after claiming its users leaves them to the retry."""
+from datetime import date
+import pytest
+from backend import tasks
+from backend.models import ReminderDelivery
+
+
+def test_failed_chunk_releases_its_claims(app, user_id, monkeypatch):
+    day = date.today().isoformat()
+
+    def broken(messages):
+        raise UnicodeEncodeError('ascii', '₹', 0, 1, 'ordinal not in range(128)')
+
+    with app.app_context():
+        monkeypatch.setattr(tasks, 'send_emails', broken)
+        with pytest.raises(UnicodeEncodeError):
+            tasks.send_reminder_chunk(day, [user_id])
+        assert ReminderDelivery.query.count() == 0
+
+        monkeypatch.setattr(tasks, 'send_emails', lambda messages: [True] * len(messages))
+        assert tasks.send_reminder_chunk(day, [user_id]) == 1
+        assert tasks.send_reminder_chunk(day, [user_id]) == 0
@@ -0,0 +1,39 @@
+"""Following X-Next-Cursor over ?active=true returns every active booking, as the user dashboard does."""
+from datetime import datetime, timedelta
+import pytz
+from sqlalchemy import insert, select
+from backend.benchmarks.common import seed_lots
+from backend.extensions import db
+from backend.models import ParkingSpot, Reservation
+
+
+def _follow(client, url, headers):
+    rows, cursor = [], None
+    while True:
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''), headers=headers)
+        assert response.status_code == 200
+        rows += response.get_json()
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return rows
+
+
+def test_active_bookings_are_all_reachable_past_the_first_page(app, client, headers, user_id):
+    with app.app_context():
+        lot_ids = seed_lots(4, 20)
+        spot_ids = db.session.execute(select(ParkingSpot.id).where(ParkingSpot.lot_id.in_(lot_ids))
+                                      .order_by(ParkingSpot.id).limit(72)).scalars().all()
+        now = datetime.now(pytz.UTC)
+        db.session.execute(insert(Reservation), [
+            {'spot_id': spot_id, 'user_id': user_id, 'booking_timestamp': now - timedelta(minutes=i), 'is_active': True}
+            for i, spot_id in enumerate(spot_ids)
+        ])
+        db.session.commit()
+
+    first_page = client.get('/api/user/reservations?active=true', headers=headers['user'])
+    assert len(first_page.get_json()) == 50
+    assert first_page.headers.get('X-Next-Cursor')
+
+    rows = _follow(client, '/api/user/reservations?active=true', headers['user'])
+    assert len({row['id'] for row in rows}) == 72
+    assert all(row['is_active'] for row in rows)
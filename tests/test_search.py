@@ -0,0 +1,37 @@
+"""Searches page with limit/offset and X-Next-Offset, with or without a query."""
+import pytest
+from backend.benchmarks.common import seed_lots, seed_users
+
+
+def _follow(client, url, headers):
+    rows, offset = [], 0
+    while offset is not None:
+        response = client.get(f'{url}&offset={offset}', headers=headers)
+        assert response.status_code == 200
+        rows += response.get_json()
+        offset = response.headers.get('X-Next-Offset')
+    return rows
+
+
+@pytest.mark.parametrize('role, url', [
+    ('admin', '/api/admin/lots/search?q='),
+    ('admin', '/api/admin/lots/search?q=bench'),
+    ('user', '/api/user/lots/search?q='),
+    ('user', '/api/user/lots/search?q=bench'),
+])
+def test_lot_search_pages_reach_every_lot(app, client, headers, role, url):
+    with app.app_context():
+        lot_ids = seed_lots(70, 1)
+    first = client.get(url, headers=headers[role])
+    assert len(first.get_json()) == 50
+    assert first.headers['X-Next-Offset'] == '50'
+    assert sorted(lot['id'] for lot in _follow(client, url, headers[role])) == lot_ids
+
+
+@pytest.mark.parametrize('url', ['/api/admin/users/search?q=', '/api/admin/users/search?q=bench'])
+def test_user_search_pages_reach_every_user(app, client, headers, user_id, url):
+    with app.app_context():
+        user_ids = seed_users(60)
+    rows = _follow(client, url + '&limit=25', headers['admin'])
+    assert user_id in user_ids
+    assert sorted(user['id'] for user in rows) == sorted(user_ids)